@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Sudoku benchmark suite
+
+Times board generation, solving a fixed corpus, puzzle creation and the
+Flask routes (through the test client, with puzzles generated inline or
+popped from a pool as separate cases and no background refill running),
+with seeded randomness so runs are comparable. Results are written as JSON:
+
+    python benchmarks/bench.py --out results.json
+    python benchmarks/bench.py --out after.json --compare results.json
+    python benchmarks/bench.py --only solve --repeat 200
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+from core.sudoku import SudokuGame
+from core.pool import PuzzlePool, VariantSource
+from core.solvers import ENGINES
+from core.codec import string_to_board
+
+# Fixed solver corpus
+CORPUS = {
+    "easy": "003020600900305001001806400008102900700000008006708200002609500800203009005010300",
+    "hard": "4.....8.5.3..........7......2.....6.....8.4......1.......6.3.7.5..2.....1.4......",
+    "escargot": "1....7.9..3..2...8..96..5....53..9...1..8...26....4...3......1..4......7..7...3..",
+    # Its solution's first row is 987654321, so a row-major 1..9 backtracker must try nearly every branch
+    "adversarial": "..............3.85..1.2.......5.7.....4...1...9.......5......73..2.1........4...9",
+}
+
+# Engine/grid pairs that take minutes and are skipped unless asked for
+SLOW = {("backtracking", "hard"), ("backtracking", "adversarial")}
+
+DIFFICULTIES = ["easy", "medium", "hard"]
+
+
+def percentile(sorted_samples: List[float], pct: float) -> float:
+    index = min(len(sorted_samples) - 1, max(0, round(pct / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Latency percentiles in milliseconds plus throughput in ops/sec"""
+    ordered = sorted(samples)
+    total = sum(samples)
+    return {
+        "runs": len(samples),
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "p50_ms": percentile(ordered, 50) * 1000,
+        "p95_ms": percentile(ordered, 95) * 1000,
+        "p99_ms": percentile(ordered, 99) * 1000,
+        "max_ms": ordered[-1] * 1000,
+        "ops_per_sec": len(samples) / total if total > 0 else 0.0,
+    }
+
+
+def measure(fn: Callable[[], object], repeat: int, setup: Optional[Callable[[], object]] = None) -> List[float]:
+    """Time repeat calls of fn; setup (untimed) runs before each call and its result is passed in"""
+    samples = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        fn(arg) if setup else fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+class Suite:
+    """Collects samples for the benchmarks selected by the --only filter"""
+
+    def __init__(self, repeat: int, seed: int, only: Optional[str] = None):
+        self.repeat = repeat
+        self.seed = seed
+        self.only = only
+        self.samples: Dict[str, List[float]] = {}
+        self.rngs: List[random.Random] = []  # per-game RNGs reseeded along with the global one
+
+    def wanted(self, name: str) -> bool:
+        return not self.only or self.only in name
+
+    def run(self, name: str, fn: Callable, setup: Optional[Callable[[], object]] = None):
+        if self.wanted(name):
+            random.seed(self.seed)
+            for rng in self.rngs:
+                rng.seed(self.seed)
+            self.samples[name] = measure(fn, self.repeat, setup)
+
+
+def bench_core(suite: Suite, include_slow: bool):
+    game = SudokuGame()
+    suite.rngs.append(game.rng)
+    suite.run("generate_complete_board", game.generate_complete_board)
+
+    for engine in ENGINES:
+        solver = SudokuGame(engine=engine)
+        for name, text in CORPUS.items():
+            if (engine, name) in SLOW and not include_slow:
+                continue
+            puzzle = string_to_board(text)
+            suite.run(f"solve_sudoku/{engine}/{name}", solver.solve_sudoku,
+                      setup=lambda: [row[:] for row in puzzle])
+
+    for difficulty in DIFFICULTIES:
+        suite.run(f"remove_numbers/{difficulty}", lambda board: game.remove_numbers(board, difficulty),
+                  setup=game.generate_complete_board)
+
+    for difficulty in DIFFICULTIES:
+        suite.run(f"new_game/{difficulty}", lambda: game.new_game(difficulty))
+
+    # Symmetry variants of one base per difficulty, generated before timing starts
+    variants = VariantSource(reuse=10 ** 9, rng=random.Random(suite.seed))
+    suite.rngs.append(variants.rng)
+    for difficulty in DIFFICULTIES:
+        variants.take(difficulty)
+        suite.run(f"new_game/variant/{difficulty}", lambda: game.new_game(difficulty, source=variants))
+
+    # Replaying a recently dealt puzzle by ID is served from the generation cache
+    game.new_game("hard")
+    puzzle_id = game.puzzle_id
+    suite.run("new_game_from_id", lambda: game.new_game_from_id(puzzle_id))
+
+
+HTTP_BENCHMARKS = ([f"http/new_game/{dealing}/{difficulty}" for dealing in ("inline", "pooled")
+                    for difficulty in DIFFICULTIES] + ["http/get_hint", "http/make_move"])
+
+
+def bench_http(suite: Suite):
+    if not any(suite.wanted(name) for name in HTTP_BENCHMARKS):
+        return
+    try:
+        sys.path.insert(0, os.path.join(ROOT, 'src', 'web'))
+        import web_gui
+    except ImportError as e:
+        print(f"Skipping HTTP benchmarks: {e}", file=sys.stderr)
+        return
+
+    # The app's pool refills in a background thread that would compete with every timed request;
+    # stop it and swap in a pool that is only filled (untimed) between requests
+    web_gui.puzzle_pool.stop()
+    pool = web_gui.puzzle_pool = PuzzlePool(size=1, low_water=0, start=False)
+    client = web_gui.app.test_client()
+    client.get('/new_game/medium')
+    for difficulty in DIFFICULTIES:
+        # Empty pool: every request generates its puzzle
+        suite.run(f"http/new_game/inline/{difficulty}", lambda: client.get(f'/new_game/{difficulty}'))
+    for difficulty in DIFFICULTIES:
+        suite.run(f"http/new_game/pooled/{difficulty}", lambda _: client.get(f'/new_game/{difficulty}'),
+                  setup=lambda: pool.fill(difficulty))
+
+    def next_move():
+        hint = client.get('/get_hint').get_json()['hint']
+        if hint is None:
+            client.get('/new_game/medium')
+            hint = client.get('/get_hint').get_json()['hint']
+        return hint
+
+    suite.run("http/get_hint", lambda: client.get('/get_hint'))
+    suite.run("http/make_move", lambda hint: client.post('/make_move', json=hint), setup=next_move)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(results: Dict[str, Dict[str, float]], baseline: Optional[Dict[str, Dict[str, float]]] = None):
+    header = f"{'benchmark':<40} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/sec':>10}"
+    if baseline:
+        header += f" {'p50 vs base':>12}"
+    print(header)
+    print("-" * len(header))
+    for name, stats in results.items():
+        line = (f"{name:<40} {stats['p50_ms']:>9.3f} {stats['p95_ms']:>9.3f} "
+                f"{stats['p99_ms']:>9.3f} {stats['ops_per_sec']:>10.1f}")
+        if baseline and name in baseline:
+            base = baseline[name]["p50_ms"]
+            line += f" {(stats['p50_ms'] - base) / base * 100:>+11.1f}%" if base else f" {'-':>12}"
+        print(line)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Sudoku benchmark suite")
+    parser.add_argument("--repeat", "-r", type=int, default=50, help="Timed runs per benchmark")
+    parser.add_argument("--seed", type=int, default=1234, help="Seed for all randomness")
+    parser.add_argument("--only", help="Run only benchmarks whose name contains this substring")
+    parser.add_argument("--no-http", action="store_true", help="Skip the Flask route benchmarks")
+    parser.add_argument("--include-slow", action="store_true",
+                        help="Also run the reference backtracker on the hard/adversarial grids")
+    parser.add_argument("--out", "-o", help="Write results JSON here")
+    parser.add_argument("--compare", "-c", help="Baseline results JSON to compare against")
+    args = parser.parse_args(argv)
+
+    suite = Suite(args.repeat, args.seed, args.only)
+    bench_core(suite, args.include_slow)
+    if not args.no_http:
+        bench_http(suite)
+    results = {name: summarize(runs) for name, runs in suite.samples.items()}
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    print_table(results, baseline)
+
+    if args.out:
+        report = {
+            "meta": {
+                "commit": git_commit(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "seed": args.seed,
+                "repeat": args.repeat,
+            },
+            "results": results,
+        }
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,6 +4,7 @@ from aws_cdk import (
     Stack,
     aws_lambda as _lambda,
     aws_apigateway as apigateway,
+    aws_secretsmanager as secretsmanager,
     Duration,
     BundlingOptions,
 )
@@ -13,6 +14,14 @@ class SudokuStack(Stack):
     def __init__(self, scope: Construct, construct_id: str, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
+        # HMAC key for the game tokens clients hold: generated at deploy time, never in source
+        token_key = secretsmanager.Secret(
+            self, "TokenSigningKey",
+            description="Key signing Sudoku game tokens",
+            generate_secret_string=secretsmanager.SecretStringGenerator(password_length=64,
+                                                                        exclude_punctuation=True),
+        )
+
         # Lambda function with dependency bundling
         sudoku_lambda = _lambda.Function(
             self, "SudokuLambda",
@@ -22,8 +31,12 @@ class SudokuStack(Stack):
                     image=_lambda.Runtime.PYTHON_3_11.bundling_image,
                     command=[
                         "bash", "-c",
-                        "pip install flask mangum a2wsgi --target /asset-output && "
-                        "cp -r src /asset-output/"
+                        "pip install mangum --target /asset-output && "
+                        "cp -r src /asset-output/ && "
+                        "python src/cli/main.py bank --count 2000 --workers 4 "
+                        "--out /asset-output/src/web/puzzles.bank && "
+                        # The CLI is only needed to build the bank, not at runtime
+                        "rm -rf /asset-output/src/cli"
                     ],
                 ),
                 exclude=[
@@ -34,7 +47,6 @@ class SudokuStack(Stack):
                     "*.pyc",
                     "test_*",
                     "src/desktop",
-                    "src/cli", 
                     "build",
                     "docs",
                     "deploy/cdk/cdk.out",
@@ -46,10 +58,14 @@ class SudokuStack(Stack):
             timeout=Duration.seconds(30),
             memory_size=512,
             environment={
-                'SECRET_KEY': 'sudoku_lambda_secret_key_456'
+                'SECRET_KEY_ARN': token_key.secret_arn,
+                # Games travel with each request as signed tokens, so any instance can serve any player
+                'SUDOKU_STATELESS': '1'
             }
         )
 
+        token_key.grant_read(sudoku_lambda)
+
         # API Gateway
         api = apigateway.LambdaRestApi(
             self, "SudokuApi",
@@ -1,6 +1,346 @@
-def main():
-    print("Hello from sudoku!")
+#!/usr/bin/env python3
+"""
+Sudoku command-line tools
+
+    python src/cli/main.py generate --count N --difficulty hard --workers K --out puzzles.txt
+    python src/cli/main.py generate --count N --box-size 4 --out puzzles16.txt
+    python src/cli/main.py generate --count N --variants 100 --out puzzles.txt
+    python src/cli/main.py solve --input puzzles.txt --workers K --out solutions.txt
+    python src/cli/main.py solve --input puzzles.txt --timeout 1 --max-nodes 100000
+    python src/cli/main.py solve --input puzzles.txt --workers 32 --parallel-after 20000
+    python src/cli/main.py bank --count N --workers K --out puzzles.bank
+    python src/cli/main.py rate --input puzzles.txt --workers K --out rated.txt
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import partial
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+# Add the parent src directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from core.sudoku import SudokuGame
+from core.solvers import ENGINES, SearchBudget, SearchBudgetExceeded
+from core.codec import board_to_string, string_to_board
+from core.bank import write_bank
+from core.logical import Contradiction, rate as rate_puzzle
+from core.parallel import ParallelSolver
+from core.pool import VariantSource
+
+DIFFICULTIES = ["easy", "medium", "hard"]
+# Error marker for a puzzle handed back unsolved for the parallel solver to finish; its result
+# is then (puzzle, nodes searched, seconds spent) so the rest of its budget can be carried over
+DEFERRED = "deferred"
+
+
+def _generate_chunk(difficulty: str, count: int, with_solutions: bool, box_size: int = 3,
+                    variants: int = 1) -> List[str]:
+    # Each game (and variant source) seeds its own RNG from the OS, so forked workers never repeat
+    # each other's puzzles
+    game = SudokuGame(box_size=box_size)
+    # Every generated puzzle is dealt as `variants` symmetry variants
+    source = VariantSource(box_size=box_size, reuse=variants) if variants > 1 else None
+    lines = []
+    for _ in range(count):
+        game.new_game(difficulty, source=source)
+        line = board_to_string(game.board)
+        if with_solutions:
+            line += " " + board_to_string(game.solution)
+        lines.append(line)
+    return lines
+
+
+def _solve_chunk(engine: str, lines: List[str], max_nodes: Optional[int] = None, timeout: Optional[float] = None,
+                 parallel_after: Optional[int] = None) -> List[Tuple[Optional[str], Optional[str]]]:
+    """Solve each line, returning (solution, error) pairs in input order; max_nodes and timeout
+    bound the search for each puzzle. A puzzle still open after parallel_after nodes comes back
+    as ((puzzle, nodes searched, seconds spent), DEFERRED)."""
+    game = SudokuGame(engine=engine)
+    defer = parallel_after is not None and (max_nodes is None or parallel_after < max_nodes)
+    results = []
+    for line in lines:
+        if not line.strip():
+            results.append(("", None))
+            continue
+        try:
+            board = string_to_board(line.split()[0])
+        except ValueError as e:
+            results.append((None, f"malformed puzzle: {e}"))
+            continue
+        budget = SearchBudget(parallel_after if defer else max_nodes, timeout)
+        start = time.monotonic()
+        try:
+            solved = game.solve_sudoku(board, budget)
+        except SearchBudgetExceeded as e:
+            if defer and e.reason == "nodes":
+                results.append(((line.split()[0], budget.nodes, time.monotonic() - start), DEFERRED))
+            else:
+                results.append((None, str(e)))
+            continue
+        if solved:
+            results.append((board_to_string(board), None))
+        else:
+            results.append((None, "no solution"))
+    return results
+
+
+def _rate_chunk(engine: str, lines: List[str]) -> List[Tuple[Optional[str], Optional[str]]]:
+    """Rate each line, returning ('<puzzle> <level> <hardest technique>', error) pairs in input order"""
+    results = []
+    for line in lines:
+        if not line.strip():
+            results.append(("", None))
+            continue
+        try:
+            puzzle = line.split()[0]
+            rating = rate_puzzle(string_to_board(puzzle))
+        except ValueError as e:
+            results.append((None, f"malformed puzzle: {e}"))
+            continue
+        except Contradiction as e:
+            results.append((None, f"invalid puzzle: {e}"))
+            continue
+        results.append((f"{puzzle} {rating.level} {rating.hardest or '-'}", None))
+    return results
+
+
+def _chunks(lines: Iterable[str], size: int) -> Iterator[List[str]]:
+    it = iter(lines)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class _Progress:
+    """Throughput reporter written to stderr"""
+
+    def __init__(self, label: str, interval: float = 2.0):
+        self.label = label
+        self.interval = interval
+        self.count = 0
+        self.start = self.last_report = time.perf_counter()
+
+    def update(self, n: int):
+        self.count += n
+        now = time.perf_counter()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            self.report(now)
+
+    def report(self, now: float = None, final: bool = False):
+        elapsed = (now or time.perf_counter()) - self.start
+        rate = self.count / elapsed if elapsed > 0 else 0.0
+        end = "\n" if final else "\r"
+        print(f"{self.count} {self.label} in {elapsed:.1f}s ({rate:.1f} {self.label}/sec)", end=end, file=sys.stderr)
+
+
+def _open_output(path: str):
+    return sys.stdout if path == "-" else open(path, "w")
+
+
+def _generated_chunks(executor: ProcessPoolExecutor, difficulty: str, count: int, chunk_size: int,
+                      max_in_flight: int, with_solutions: bool = True, box_size: int = 3,
+                      variants: int = 1) -> Iterator[List[str]]:
+    """Yield chunks of generated puzzle lines in completion order, keeping at most max_in_flight tasks queued"""
+    remaining = count
+    pending = set()
+    while remaining or pending:
+        while remaining and len(pending) < max_in_flight:
+            size = min(chunk_size, remaining)
+            pending.add(executor.submit(_generate_chunk, difficulty, size, with_solutions, box_size, variants))
+            remaining -= size
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield future.result()
+
+
+def generate(args: argparse.Namespace) -> int:
+    """Fan puzzle generation across a process pool, streaming lines to the output as chunks finish"""
+    out = _open_output(args.out)
+    progress = _Progress("puzzles")
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            for lines in _generated_chunks(executor, args.difficulty, args.count, args.chunk_size,
+                                           args.workers * 2, not args.puzzles_only, args.box_size,
+                                           args.variants):
+                out.write("\n".join(lines) + "\n")
+                progress.update(len(lines))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    progress.report(final=True)
+    return 0
+
+
+def build_bank(args: argparse.Namespace) -> int:
+    """Generate puzzles for each difficulty straight into a memory-mappable bank file"""
+    progress = _Progress("puzzles")
+
+    def puzzles(executor, difficulty):
+        for lines in _generated_chunks(executor, difficulty, args.count, args.chunk_size, args.workers * 2):
+            for line in lines:
+                puzzle, solution = line.split()
+                yield string_to_board(puzzle), string_to_board(solution)
+            progress.update(len(lines))
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        write_bank(args.out, {difficulty: puzzles(executor, difficulty) for difficulty in args.difficulties})
+    progress.report(final=True)
+    return 0
+
+
+def _stream(args: argparse.Namespace, worker, what: str, finish=None,
+            executor: Optional[ProcessPoolExecutor] = None) -> int:
+    """Stream input lines through a process pool, writing results in input order.
+
+    At most 2 * workers chunks are read ahead, so memory stays flat however
+    large the input is. Each failed line is reported on stderr and written as
+    an empty line, keeping output lines aligned with input lines. finish, if
+    given, maps each (result, error) pair before it is written. executor, if
+    given, is used (and left running) instead of a pool of args.workers.
+    """
+    source = sys.stdin if args.input == "-" else open(args.input)
+    out = _open_output(args.out)
+    progress = _Progress("puzzles")
+    max_in_flight = args.workers * 2
+    failures = 0
+
+    def drain(first_line: int, future) -> int:
+        errors = 0
+        for offset, (result, error) in enumerate(future.result()):
+            if finish is not None:
+                result, error = finish(result, error)
+            if error is not None:
+                print(f"line {first_line + offset}: {error}", file=sys.stderr)
+                errors += 1
+                result = ""
+            out.write(result + "\n")
+        progress.update(offset + 1)
+        return errors
+
+    try:
+        with nullcontext(executor) if executor else ProcessPoolExecutor(max_workers=args.workers) as executor:
+            pending = deque()
+            line_no = 1
+            for chunk in _chunks(source, args.chunk_size):
+                pending.append((line_no, executor.submit(worker, args.engine, chunk)))
+                line_no += len(chunk)
+                if len(pending) >= max_in_flight:
+                    failures += drain(*pending.popleft())
+            while pending:
+                failures += drain(*pending.popleft())
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+    progress.report(final=True)
+    if failures:
+        print(f"{failures} puzzle(s) could not be {what}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+def solve(args: argparse.Namespace) -> int:
+    """Solve puzzles line by line; output line N is the solution of input line N.
+
+    With --parallel-after, the few puzzles that outlast that many nodes are
+    finished one at a time by a search split across all workers, instead of
+    leaving one worker grinding on each while the others run dry. Both run on
+    one pool of --workers processes, and --max-nodes and --timeout still cap a
+    puzzle's total search, the nodes and time it used before deferral included.
+    """
+    worker = partial(_solve_chunk, max_nodes=args.max_nodes, timeout=args.timeout, parallel_after=args.parallel_after)
+    if args.parallel_after is None:
+        return _stream(args, worker, "solved")
+    with ParallelSolver(args.workers) as engine:
+        game = SudokuGame(engine=engine)
+
+        def finish(result, error):
+            if error != DEFERRED:
+                return result, error
+            puzzle, nodes, seconds = result
+            board = string_to_board(puzzle)
+            max_nodes = args.max_nodes - nodes if args.max_nodes is not None else None
+            timeout = max(args.timeout - seconds, 0) if args.timeout is not None else None
+            try:
+                solved = game.solve_sudoku(board, SearchBudget(max_nodes, timeout))
+            except SearchBudgetExceeded as e:
+                return None, str(e)
+            return (board_to_string(board), None) if solved else (None, "no solution")
+
+        return _stream(args, worker, "solved", finish, engine.pool())
+
+
+def rate(args: argparse.Namespace) -> int:
+    """Label puzzles with the difficulty level and hardest technique the logical solver needed"""
+    return _stream(args, _rate_chunk, "rated")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="sudoku", description="Sudoku command-line tools")
+    subparsers = parser.add_subparsers(dest="command")
+
+    gen = subparsers.add_parser("generate", help="Generate puzzles in bulk across worker processes")
+    gen.add_argument("--count", "-n", type=int, default=100, help="Number of puzzles to generate")
+    gen.add_argument("--difficulty", "-d", choices=DIFFICULTIES, default="medium")
+    gen.add_argument("--workers", "-w", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    gen.add_argument("--out", "-o", default="-", help="Output file ('-' for stdout)")
+    gen.add_argument("--chunk-size", type=int, default=50, help="Puzzles per worker task")
+    gen.add_argument("--puzzles-only", action="store_true",
+                     help="Write only the 81-char puzzle, not '<puzzle> <solution>'")
+    gen.add_argument("--box-size", type=int, choices=[2, 3, 4, 5], default=3,
+                     help="Box size N for N²×N² boards (3 = classic 9x9, 4 = 16x16, 5 = 25x25)")
+    gen.add_argument("--variants", type=int, default=1, metavar="K",
+                     help="Deal each generated puzzle as K symmetry variants (relabelled, permuted, transposed) "
+                          "of the same difficulty, close to K times faster")
+    gen.set_defaults(func=generate)
+
+    sol = subparsers.add_parser("solve", help="Solve 81-char-per-line puzzles from a file or stdin")
+    sol.add_argument("--input", "-i", default="-", help="Input file ('-' for stdin)")
+    sol.add_argument("--out", "-o", default="-", help="Output file ('-' for stdout)")
+    sol.add_argument("--workers", "-w", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    sol.add_argument("--engine", "-e", choices=sorted(ENGINES), default="mrv", help="Solver engine")
+    sol.add_argument("--chunk-size", type=int, default=200, help="Lines per worker task")
+    sol.add_argument("--max-nodes", type=int, default=None, help="Give up on a puzzle after this many search nodes")
+    sol.add_argument("--timeout", type=float, default=None, help="Give up on a puzzle after this many seconds")
+    sol.add_argument("--parallel-after", type=int, default=None, metavar="NODES",
+                     help="Finish puzzles still open after NODES search nodes with all workers at once")
+    sol.set_defaults(func=solve)
+
+    rat = subparsers.add_parser("rate", help="Rate puzzles by the hardest human technique they need")
+    rat.add_argument("--input", "-i", default="-", help="Input file ('-' for stdin)")
+    rat.add_argument("--out", "-o", default="-", help="Output file ('-' for stdout)")
+    rat.add_argument("--workers", "-w", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    rat.add_argument("--chunk-size", type=int, default=200, help="Lines per worker task")
+    rat.set_defaults(func=rate, engine=None)
+
+    bank = subparsers.add_parser("bank", help="Build a memory-mapped puzzle bank file")
+    bank.add_argument("--count", "-n", type=int, default=1000, help="Puzzles per difficulty")
+    bank.add_argument("--difficulties", nargs="+", choices=DIFFICULTIES, default=DIFFICULTIES)
+    bank.add_argument("--workers", "-w", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    bank.add_argument("--out", "-o", required=True, help="Bank file to write")
+    bank.add_argument("--chunk-size", type=int, default=50, help="Puzzles per worker task")
+    bank.set_defaults(func=build_bank)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return 1
+    return args.func(args)
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+Memory-mapped puzzle bank.
+
+File layout (little-endian):
+
+    header   8s magic "SDKBANK1", H record size, B box size, B difficulty count
+    index    per difficulty: 8s name (NUL-padded), Q byte offset of first record, I record count
+    records  fixed-size: nibble-packed puzzle followed by nibble-packed solution
+
+Records of one difficulty are contiguous, so loading a random puzzle is a
+single slice of the mapping at offset + k * record_size.
+"""
+
+import mmap
+import random
+import struct
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    from .codec import BOARD_BYTES, BOX_SIZE, pack_board, unpack_board
+except ImportError:
+    from codec import BOARD_BYTES, BOX_SIZE, pack_board, unpack_board
+
+Puzzle = Tuple[List[List[int]], List[List[int]]]
+
+MAGIC = b"SDKBANK1"
+RECORD_SIZE = 2 * BOARD_BYTES
+_HEADER = struct.Struct("<8sHBB")
+_INDEX_ENTRY = struct.Struct("<8sQI")
+
+
+def write_bank(path: str, puzzles: Dict[str, Iterable[Puzzle]]):
+    """Write a bank from {difficulty: iterable of (puzzle, solution)}; iterables are consumed lazily"""
+    names = list(puzzles)
+    for name in names:
+        if not 0 < len(name.encode("ascii")) <= 8:
+            raise ValueError(f"difficulty name must be 1-8 ASCII characters: {name!r}")
+    records_start = _HEADER.size + _INDEX_ENTRY.size * len(names)
+    index = []
+    with open(path, "wb") as f:
+        f.write(b"\0" * records_start)
+        offset = records_start
+        for name in names:
+            count = 0
+            for puzzle, solution in puzzles[name]:
+                f.write(pack_board(puzzle) + pack_board(solution))
+                count += 1
+            index.append((name, offset, count))
+            offset += count * RECORD_SIZE
+        # Header and index go in last, once the record counts are known
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, RECORD_SIZE, BOX_SIZE, len(names)))
+        for name, offset, count in index:
+            f.write(_INDEX_ENTRY.pack(name.encode("ascii"), offset, count))
+
+
+class PuzzleBank:
+    """Read-only, memory-mapped puzzle bank.
+
+    Usable as a SudokuGame.new_game source: take(difficulty) returns a
+    random (puzzle, solution) pair in O(1) without reading the rest of the file.
+    """
+
+    def __init__(self, path: str, rng: Optional[random.Random] = None):
+        self.path = path
+        self.rng = rng or random
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, record_size, box_size, count = _HEADER.unpack_from(self._mmap, 0)
+            if magic != MAGIC or record_size != RECORD_SIZE or box_size != BOX_SIZE:
+                raise ValueError(f"{path} is not a compatible puzzle bank")
+            self._index: Dict[str, Tuple[int, int]] = {}
+            for k in range(count):
+                name, offset, n = _INDEX_ENTRY.unpack_from(self._mmap, _HEADER.size + k * _INDEX_ENTRY.size)
+                if offset + n * RECORD_SIZE > len(self._mmap):
+                    raise ValueError(f"{path} is truncated")
+                self._index[name.rstrip(b"\0").decode("ascii")] = (offset, n)
+        except (struct.error, ValueError):
+            self.close()
+            raise
+
+    def counts(self) -> Dict[str, int]:
+        """Number of puzzles per difficulty"""
+        return {name: n for name, (_, n) in self._index.items()}
+
+    def get(self, difficulty: str, index: int) -> Puzzle:
+        """Load record index of a difficulty"""
+        offset, n = self._index[difficulty]
+        if not 0 <= index < n:
+            raise IndexError(f"{difficulty} bank has {n} puzzles")
+        start = offset + index * RECORD_SIZE
+        return (unpack_board(self._mmap[start:start + BOARD_BYTES]),
+                unpack_board(self._mmap[start + BOARD_BYTES:start + RECORD_SIZE]))
+
+    def take(self, difficulty: str) -> Optional[Puzzle]:
+        """Load a random puzzle of the difficulty, or None if the bank has none"""
+        entry = self._index.get(difficulty)
+        if entry is None or entry[1] == 0:
+            return None
+        return self.get(difficulty, self.rng.randrange(entry[1]))
+
+    def close(self):
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
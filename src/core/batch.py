@@ -0,0 +1,52 @@
+"""
+Vectorized validation of many boards at once.
+
+Requires NumPy (pip install "sudoku[batch]" or pip install numpy).
+"""
+
+from typing import NamedTuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is an optional dependency
+    np = None
+
+
+class BatchReport(NamedTuple):
+    complete: "np.ndarray"   # (N,) bool: no empty cells
+    valid: "np.ndarray"      # (N,) bool: no digit repeated in any row, column or box
+    conflicts: "np.ndarray"  # (N, 9, 9) bool: cells whose digit is repeated in one of their units
+
+    @property
+    def solved(self) -> "np.ndarray":
+        """(N,) bool: complete and valid"""
+        return self.complete & self.valid
+
+
+def check_boards(boards) -> BatchReport:
+    """Check an (N, 9, 9) array-like of boards (0 = empty) for completeness and conflicts"""
+    if np is None:
+        raise ImportError("check_boards requires NumPy: pip install numpy")
+    boards = np.asarray(boards)
+    if boards.ndim == 2:
+        boards = boards[np.newaxis]
+    if boards.ndim != 3 or boards.shape[1:] != (9, 9):
+        raise ValueError(f"expected an (N, 9, 9) array of boards, got shape {boards.shape}")
+    if boards.size and (boards.min() < 0 or boards.max() > 9):
+        raise ValueError("board values must be in 0..9")
+
+    # One-hot digits: onehot[n, r, c, d] is True when cell (r, c) holds digit d + 1
+    onehot = boards[..., np.newaxis] == np.arange(1, 10)
+    counts = onehot.view(np.uint8)
+    row_dup = counts.sum(axis=2, dtype=np.uint8) > 1                       # (N, 9 rows, 9 digits)
+    col_dup = counts.sum(axis=1, dtype=np.uint8) > 1                       # (N, 9 cols, 9 digits)
+    box_dup = counts.reshape(-1, 3, 3, 3, 3, 9).sum(axis=(2, 4), dtype=np.uint8) > 1  # (N, 3, 3, 9 digits)
+
+    # Broadcast each unit's duplicate digits back onto its cells
+    dup = (row_dup[:, :, np.newaxis, :] | col_dup[:, np.newaxis, :, :] |
+           box_dup.repeat(3, axis=1).repeat(3, axis=2))
+    conflicts = (onehot & dup).any(axis=-1)
+
+    complete = (boards != 0).all(axis=(1, 2))
+    valid = ~conflicts.any(axis=(1, 2))
+    return BatchReport(complete=complete, valid=valid, conflicts=conflicts)
@@ -0,0 +1,91 @@
+"""
+Flat board storage.
+
+A FlatBoard keeps an N²×N² board's cells row-major in one bytearray (0 =
+empty), so copying or snapshotting it is a single memory copy instead of a
+list per row, and the codec and the solvers can read the cells directly.
+board[row] is a writable memoryview of that row, so code written for nested
+lists -- board[row][col] reads and writes, len(board), iterating rows --
+works on it unchanged:
+
+    board = FlatBoard.from_rows(string_to_board(text))
+    saved = board.snapshot()
+    board[4][4] = 5
+    board.restore(saved)
+"""
+
+from typing import Iterator, List, Optional, Sequence
+
+
+class FlatBoard:
+    """size×size cells in one bytearray; cell (row, col) is cells[row * size + col]"""
+
+    __slots__ = ("size", "cells", "_view")
+
+    def __init__(self, size: int, cells: Optional[bytes] = None):
+        """An empty board, or one holding a copy of cells (size * size bytes, row-major)"""
+        self.size = size
+        self.cells = bytearray(cells) if cells is not None else bytearray(size * size)
+        if len(self.cells) != size * size:
+            raise ValueError(f"expected {size * size} cells, got {len(self.cells)}")
+        self._view = memoryview(self.cells)
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Sequence[int]]) -> "FlatBoard":
+        """A FlatBoard holding a copy of rows (nested lists or another FlatBoard)"""
+        if isinstance(rows, FlatBoard):
+            return rows.copy()
+        return cls(len(rows), bytes([num for row in rows for num in row]))
+
+    def copy(self) -> "FlatBoard":
+        return FlatBoard(self.size, self.cells)
+
+    def snapshot(self) -> bytes:
+        """The cells as immutable bytes, for restore() or FlatBoard(size, snapshot)"""
+        return bytes(self.cells)
+
+    def restore(self, snapshot: bytes):
+        """Put back the cells saved by snapshot()"""
+        if len(snapshot) != len(self.cells):
+            raise ValueError(f"expected {len(self.cells)} cells, got {len(snapshot)}")
+        self.cells[:] = snapshot
+
+    def rows(self) -> List[List[int]]:
+        """The board as nested lists"""
+        return list(self)
+
+    def __getitem__(self, row: int) -> memoryview:
+        if row < 0:
+            row += self.size
+        if not 0 <= row < self.size:
+            raise IndexError("board row out of range")
+        return self._view[row * self.size:(row + 1) * self.size]
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self) -> Iterator[List[int]]:
+        """Each row as a new list (so [row[:] for row in board] still copies)"""
+        cells, size = self.cells, self.size
+        for start in range(0, size * size, size):
+            yield list(cells[start:start + size])
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, FlatBoard):
+            return self.size == other.size and self.cells == other.cells
+        if isinstance(other, (list, tuple)):
+            return self.rows() == [list(row) for row in other]
+        return NotImplemented
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return FlatBoard, (self.size, bytes(self.cells))
+
+    def __repr__(self) -> str:
+        return f"FlatBoard({self.size}, {bytes(self.cells)!r})"
+
+
+def as_flat(board: Sequence[Sequence[int]]) -> FlatBoard:
+    """board itself if it is a FlatBoard, otherwise a FlatBoard copy of its rows"""
+    return board if isinstance(board, FlatBoard) else FlatBoard.from_rows(board)
@@ -0,0 +1,242 @@
+"""
+Compact encodings for boards, solutions and given-cell masks.
+
+Two forms are provided:
+
+* Text, for wire transfer and puzzle files: a board is one character per
+  cell ('0' = empty, '.' is also accepted when parsing; digits above 9 are
+  the letters A-P), 81 characters for a 9x9 board, and a given-cell mask is
+  the same number of '0'/'1' characters.
+* Packed state, for session storage: a 2-byte header (format version and
+  box size), the game's version history (current version, the version its
+  puzzle started at and the most recently changed cells), the board and the
+  solution nibble-packed (two cells per byte; one byte per cell on 16x16
+  and larger boards) and the givens as a bitset -- 104 bytes plus one per
+  remembered change for 9x9. Version 1 states (no history) are still read.
+
+Puzzle IDs are 11 URL-safe characters naming the seed, difficulty and box
+size a puzzle was generated from, or 16 for a variant of such a puzzle,
+which also names the seed of the symmetry transform applied to it (see
+core.transforms); SudokuGame.new_game_from_id() rebuilds the exact puzzle
+and solution from either.
+"""
+
+import base64
+import operator
+import struct
+import zlib
+from typing import List, NamedTuple, Optional, Sequence, Tuple, Union
+
+try:
+    from .board import FlatBoard
+except ImportError:
+    from board import FlatBoard
+
+Board = Union[List[List[int]], FlatBoard]  # nested lists or flat storage; parsing gives lists, unpacking flat
+Givens = List[List[bool]]
+
+STATE_VERSION = 2
+BOX_SIZE = 3
+SIZE = BOX_SIZE * BOX_SIZE
+CELLS = SIZE * SIZE
+BOARD_BYTES = (CELLS + 1) // 2
+# Cell characters by value; '0' is an empty cell
+DIGITS = "0123456789ABCDEFGHIJKLMNOP"
+# Box sizes that can be encoded, keyed by cell count
+_BOX_SIZES = {(n * n) ** 2: n for n in range(2, 6)}
+# version, version the puzzle started at, number of changed-cell indices that follow
+_HISTORY = struct.Struct("<IIB")
+# bytes.translate tables: cell value -> character, and the halves of a nibble-packed byte
+_TO_DIGITS = DIGITS.encode("ascii") + bytes(range(len(DIGITS), 256))
+_HIGH_NIBBLE = bytes(b >> 4 for b in range(256))
+_LOW_NIBBLE = bytes(b & 0x0F for b in range(256))
+_TO_HIGH_NIBBLE = bytes((b << 4) & 0xFF for b in range(256))
+
+PUZZLE_ID_VERSION = 1
+VARIANT_ID_VERSION = 2
+PUZZLE_DIFFICULTIES = ("easy", "medium", "hard")
+SEED_BITS = 48
+TRANSFORM_BITS = 32
+# ID version, box size << 2 | difficulty index, then the seed (only its low 6 bytes are kept);
+# variant IDs append the transform seed
+_PUZZLE_ID = struct.Struct("<BBQ")
+_TRANSFORM_SEED = struct.Struct("<I")
+
+
+class GameState(NamedTuple):
+    board: FlatBoard
+    solution: FlatBoard
+    givens: Givens
+    version: int = 0          # bumped on every cell change and new puzzle
+    started: int = 0          # version at which the current puzzle was dealt
+    changes: Tuple[int, ...] = ()  # flat indices of the most recent changes, oldest first
+
+
+def _box_size(cells: int) -> int:
+    box_size = _BOX_SIZES.get(cells)
+    if box_size is None:
+        raise ValueError(f"expected {CELLS} cells (or 16, 256 or 625), got {cells}")
+    return box_size
+
+
+def board_to_string(board: Board) -> str:
+    """Flatten a board into one character per cell ('0' = empty, 'A' = 10 and up)"""
+    if isinstance(board, FlatBoard):
+        return board.cells.translate(_TO_DIGITS).decode("ascii")
+    return "".join([DIGITS[num] for row in board for num in row])
+
+
+def string_to_board(text: str) -> List[List[int]]:
+    """Parse a board of 16, 81, 256 or 625 cells ('0' or '.' = empty)"""
+    size = _box_size(len(text)) ** 2
+    cells = []
+    for ch in text.upper():
+        num = 0 if ch == "." else DIGITS.find(ch)
+        if not 0 <= num <= size:
+            raise ValueError(f"invalid character {ch!r}")
+        cells.append(num)
+    return [cells[i:i + size] for i in range(0, len(cells), size)]
+
+
+def givens_from_board(board: Board) -> Givens:
+    """Mark every filled cell of a freshly generated puzzle as a given"""
+    return [[num != 0 for num in row] for row in board]
+
+
+def givens_to_string(givens: Givens) -> str:
+    """Flatten a given-cell mask into a '0'/'1' string, one character per cell"""
+    return "".join(["1" if given else "0" for row in givens for given in row])
+
+
+def string_to_givens(text: str) -> Givens:
+    if set(text) - {"0", "1"}:
+        raise ValueError("expected a '0'/'1' string")
+    size = _box_size(len(text)) ** 2
+    return [[ch == "1" for ch in text[i:i + size]] for i in range(0, len(text), size)]
+
+
+def _board_bytes(size: int) -> int:
+    return size * size if size > 15 else (size * size + 1) // 2
+
+
+def pack_board(board: Board) -> bytes:
+    """Nibble-pack a board, two cells per byte (41 bytes for 9x9); 16x16 and larger take a byte per cell"""
+    if isinstance(board, FlatBoard):
+        if board.size > 15:
+            return bytes(board.cells)
+        cells = board.cells + b"\0" if len(board.cells) % 2 else board.cells
+        return bytes(map(operator.or_, cells[0::2].translate(_TO_HIGH_NIBBLE), cells[1::2]))
+    cells = [num for row in board for num in row]
+    if len(board) > 15:
+        return bytes(cells)
+    cells.append(0)
+    return bytes([(cells[i] << 4) | cells[i + 1] for i in range(0, len(cells) - 1, 2)])
+
+
+def unpack_board(data: bytes, size: int = SIZE) -> FlatBoard:
+    """Inverse of pack_board"""
+    if size > 15:
+        return FlatBoard(size, data)
+    cells = bytearray(2 * len(data))
+    cells[0::2] = data.translate(_HIGH_NIBBLE)
+    cells[1::2] = data.translate(_LOW_NIBBLE)
+    del cells[size * size:]
+    return FlatBoard(size, cells)
+
+
+def pack_state(board: Board, solution: Board, givens: Givens, version: int = 0, started: int = 0,
+               changes: Sequence[int] = ()) -> bytes:
+    """Pack a game's board, solution, given-cell mask and version history (104 bytes plus one per change
+    for 9x9; changed-cell indices take two bytes each on boards of more than 256 cells)"""
+    size = len(board)
+    cells = size * size
+    bits = 0
+    for index, given in enumerate(given for row in givens for given in row):
+        if given:
+            bits |= 1 << index
+    history = bytes(changes) if cells <= 256 else struct.pack(f"<{len(changes)}H", *changes)
+    return (bytes([STATE_VERSION, _box_size(cells)]) + _HISTORY.pack(version, started, len(changes)) + history +
+            pack_board(board) + pack_board(solution) + bits.to_bytes((cells + 7) // 8, "little"))
+
+
+def unpack_state(data: bytes) -> GameState:
+    """Inverse of pack_state; raises ValueError on malformed input"""
+    if len(data) < 2 or data[1] not in _BOX_SIZES.values() or data[0] not in (1, STATE_VERSION):
+        raise ValueError("not a packed Sudoku state")
+    size = data[1] * data[1]
+    cells = size * size
+    board_bytes = _board_bytes(size)
+    version = started = 0
+    changes: Tuple[int, ...] = ()
+    offset = 2
+    if data[0] == STATE_VERSION:
+        if len(data) < offset + _HISTORY.size:
+            raise ValueError("not a packed Sudoku state")
+        version, started, count = _HISTORY.unpack_from(data, offset)
+        offset += _HISTORY.size
+        if cells <= 256:
+            changes = tuple(data[offset:offset + count])
+            offset += count
+        else:
+            changes = struct.unpack_from(f"<{count}H", data, offset) if len(data) >= offset + 2 * count else ()
+            offset += 2 * count
+    if len(data) != offset + 2 * board_bytes + (cells + 7) // 8 or any(index >= cells for index in changes):
+        raise ValueError("not a packed Sudoku state")
+    board = unpack_board(data[offset:offset + board_bytes], size)
+    solution = unpack_board(data[offset + board_bytes:offset + 2 * board_bytes], size)
+    bits = int.from_bytes(data[offset + 2 * board_bytes:], "little")
+    givens = [[bool(bits >> (i * size + j) & 1) for j in range(size)] for i in range(size)]
+    return GameState(board, solution, givens, version, started, changes)
+
+
+def encode_state(board: Board, solution: Board, givens: Givens, version: int = 0, started: int = 0,
+                 changes: Sequence[int] = ()) -> str:
+    """pack_state as URL/cookie-safe base64 text"""
+    return base64.urlsafe_b64encode(pack_state(board, solution, givens, version, started, changes)).decode("ascii")
+
+
+def decode_state(text: str) -> GameState:
+    try:
+        data = base64.urlsafe_b64decode(text.encode("ascii"))
+    except (ValueError, UnicodeEncodeError) as e:
+        raise ValueError("not a packed Sudoku state") from e
+    return unpack_state(data)
+
+
+def encode_puzzle_id(box_size: int, difficulty: str, seed: int, transform: Optional[int] = None) -> str:
+    """Compact, URL-safe ID for the puzzle generated from seed (0 <= seed < 2**SEED_BITS), or for its
+    variant under the transform drawn from transform (0 <= transform < 2**TRANSFORM_BITS)"""
+    if (difficulty not in PUZZLE_DIFFICULTIES or box_size not in _BOX_SIZES.values() or
+            not 0 <= seed < 1 << SEED_BITS or not (transform is None or 0 <= transform < 1 << TRANSFORM_BITS)):
+        raise ValueError(f"cannot encode a puzzle ID for {(box_size, difficulty, seed, transform)}")
+    version = PUZZLE_ID_VERSION if transform is None else VARIANT_ID_VERSION
+    data = _PUZZLE_ID.pack(version, box_size << 2 | PUZZLE_DIFFICULTIES.index(difficulty), seed)[:-2]
+    if transform is not None:
+        data += _TRANSFORM_SEED.pack(transform)
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def decode_puzzle_id(text: str) -> Tuple[int, str, int, Optional[int]]:
+    """Inverse of encode_puzzle_id: (box_size, difficulty, seed, transform or None); raises ValueError
+    on malformed IDs"""
+    try:
+        data = base64.urlsafe_b64decode(text.encode("ascii") + b"=")
+    except (ValueError, UnicodeEncodeError) as e:
+        raise ValueError("not a puzzle ID") from e
+    base = _PUZZLE_ID.size - 2
+    if len(data) == base:
+        expected, transform = PUZZLE_ID_VERSION, None
+    elif len(data) == base + _TRANSFORM_SEED.size:
+        expected, transform = VARIANT_ID_VERSION, _TRANSFORM_SEED.unpack_from(data, base)[0]
+    else:
+        raise ValueError("not a puzzle ID")
+    version, packed, seed = _PUZZLE_ID.unpack(data[:base] + b"\0\0")
+    box_size, index = packed >> 2, packed & 3
+    if version != expected or box_size not in _BOX_SIZES.values() or index >= len(PUZZLE_DIFFICULTIES):
+        raise ValueError("not a puzzle ID")
+    return box_size, PUZZLE_DIFFICULTIES[index], seed, transform
+
+
+def state_etag(text: str) -> str:
+    """HTTP entity tag (unquoted) for an encoded state: changes whenever the state does"""
+    return f"{zlib.crc32(text.encode('ascii')):08x}"
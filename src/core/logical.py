@@ -0,0 +1,296 @@
+"""
+Human-style logical solver and difficulty rating.
+
+Techniques run over per-cell candidate bitsets (bit n set = digit n still
+possible), easiest first; after every successful step the solver restarts
+from the easiest technique. A puzzle's rating is the level of the hardest
+technique it needed, or "expert" if logic alone gets stuck and guessing
+is required.
+"""
+
+from itertools import combinations
+from typing import Dict, List, NamedTuple, Optional
+
+try:
+    from .solvers import MRVSolver, SearchBudget, SolverEngine, geometry_of, register_engine
+except ImportError:
+    from solvers import MRVSolver, SearchBudget, SolverEngine, geometry_of, register_engine
+
+# (technique, level), in the order they are tried
+TECHNIQUES = [
+    ("naked_single", "easy"),
+    ("hidden_single", "easy"),
+    ("pointing", "medium"),
+    ("box_line", "medium"),
+    ("naked_pair", "medium"),
+    ("hidden_pair", "medium"),
+    ("naked_triple", "hard"),
+    ("hidden_triple", "hard"),
+    ("x_wing", "hard"),
+]
+LEVELS = ["easy", "medium", "hard", "expert"]
+
+
+class Rating(NamedTuple):
+    level: str                 # "easy", "medium", "hard" or "expert" (needs guessing)
+    hardest: Optional[str]     # hardest technique used, None if nothing was needed
+    solved: bool               # True if logic alone solved the puzzle
+    steps: Dict[str, int]      # how often each technique was applied
+
+
+class Contradiction(Exception):
+    """The grid has a cell with no candidates or a repeated digit"""
+
+
+class CandidateGrid:
+    """Cells plus candidate bitsets, with the logical techniques as methods"""
+
+    __slots__ = ("geo", "rows", "cols", "boxes", "digit_bits", "cells", "cands", "empty")
+
+    def __init__(self, board: List[List[int]]):
+        geo = self.geo = geometry_of(board)
+        size = geo.size
+        self.rows, self.cols, self.boxes = geo.units[:size], geo.units[size:2 * size], geo.units[2 * size:]
+        self.digit_bits = [(d, 1 << d) for d in range(1, size + 1)]
+        self.cells = [num for row in board for num in row]
+        self.cands = [0 if num else geo.all_digits for num in self.cells]
+        self.empty = self.cells.count(0)
+        for i, num in enumerate(self.cells):
+            if num:
+                bit = 1 << num
+                for p in geo.peers[i]:
+                    if self.cells[p] == num:
+                        raise Contradiction(f"digit {num} repeated")
+                    self.cands[p] &= ~bit
+
+    def to_board(self) -> List[List[int]]:
+        size = self.geo.size
+        return [self.cells[r * size:r * size + size] for r in range(size)]
+
+    def place(self, i: int, num: int):
+        bit = 1 << num
+        self.cells[i] = num
+        self.cands[i] = 0
+        self.empty -= 1
+        cands = self.cands
+        for p in self.geo.peers[i]:
+            if cands[p] & bit:
+                cands[p] &= ~bit
+                if not cands[p]:
+                    raise Contradiction("cell left without candidates")
+
+    def eliminate(self, cells, mask: int) -> bool:
+        """Remove mask from the candidates of cells; True if anything changed"""
+        changed = False
+        cands = self.cands
+        for i in cells:
+            if cands[i] & mask:
+                cands[i] &= ~mask
+                if not cands[i]:
+                    raise Contradiction("cell left without candidates")
+                changed = True
+        return changed
+
+    # Techniques: each returns how many times it applied (digits placed or
+    # eliminations made); 0 means no progress
+
+    def naked_single(self) -> int:
+        cands = self.cands
+        placed = 0
+        for i in range(self.geo.cells):
+            cand = cands[i]
+            if cand and not cand & (cand - 1):
+                self.place(i, cand.bit_length() - 1)
+                placed += 1
+        return placed
+
+    def hidden_single(self) -> int:
+        cands = self.cands
+        placed = 0
+        for unit in self.geo.units:
+            once = twice = 0
+            for i in unit:
+                twice |= once & cands[i]
+                once |= cands[i]
+            hidden = once & ~twice
+            while hidden:
+                bit = hidden & -hidden
+                hidden ^= bit
+                for i in unit:
+                    if cands[i] & bit:
+                        self.place(i, bit.bit_length() - 1)
+                        placed += 1
+                        break
+        return placed
+
+    def _positions(self, unit: List[int], bit: int) -> List[int]:
+        cands = self.cands
+        return [i for i in unit if cands[i] & bit]
+
+    def pointing(self) -> int:
+        """A digit confined to one row (column) of a box is removed from the rest of that row (column)"""
+        row_of, col_of, box_of = self.geo.row_of, self.geo.col_of, self.geo.box_of
+        for box in self.boxes:
+            for _, bit in self.digit_bits:
+                cells = self._positions(box, bit)
+                if len(cells) < 2:
+                    continue
+                rows = {row_of[i] for i in cells}
+                if len(rows) == 1:
+                    if self.eliminate([i for i in self.rows[rows.pop()] if box_of[i] != box_of[cells[0]]], bit):
+                        return 1
+                    continue
+                cols = {col_of[i] for i in cells}
+                if len(cols) == 1:
+                    if self.eliminate([i for i in self.cols[cols.pop()] if box_of[i] != box_of[cells[0]]], bit):
+                        return 1
+        return 0
+
+    def box_line(self) -> int:
+        """A digit confined to one box within a row or column is removed from the rest of that box"""
+        box_of = self.geo.box_of
+        for line, key in ((self.rows, self.geo.row_of), (self.cols, self.geo.col_of)):
+            for unit in line:
+                for _, bit in self.digit_bits:
+                    cells = self._positions(unit, bit)
+                    if len(cells) < 2:
+                        continue
+                    boxes = {box_of[i] for i in cells}
+                    if len(boxes) == 1:
+                        k = key[cells[0]]
+                        if self.eliminate([i for i in self.boxes[boxes.pop()] if key[i] != k], bit):
+                            return 1
+        return 0
+
+    def _naked_subset(self, size: int) -> int:
+        cands = self.cands
+        for unit in self.geo.units:
+            pool = [i for i in unit if cands[i] and cands[i].bit_count() <= size]
+            for group in combinations(pool, size):
+                mask = 0
+                for i in group:
+                    mask |= cands[i]
+                if mask.bit_count() == size:
+                    if self.eliminate([i for i in unit if i not in group], mask):
+                        return 1
+        return 0
+
+    def _hidden_subset(self, size: int) -> int:
+        cands = self.cands
+        for unit in self.geo.units:
+            where = {}
+            for d, bit in self.digit_bits:
+                cells = [i for i in unit if cands[i] & bit]
+                if 2 <= len(cells) <= size:
+                    where[d] = cells
+            for digits in combinations(where, size):
+                cells = set()
+                for d in digits:
+                    cells.update(where[d])
+                if len(cells) == size:
+                    keep = 0
+                    for d in digits:
+                        keep |= 1 << d
+                    if self.eliminate(cells, self.geo.all_digits & ~keep):
+                        return 1
+        return 0
+
+    def naked_pair(self) -> int:
+        return self._naked_subset(2)
+
+    def naked_triple(self) -> int:
+        return self._naked_subset(3)
+
+    def hidden_pair(self) -> int:
+        return self._hidden_subset(2)
+
+    def hidden_triple(self) -> int:
+        return self._hidden_subset(3)
+
+    def x_wing(self) -> int:
+        """A digit confined to the same two columns in two rows is removed from the rest of those columns
+        (and the same with rows and columns swapped)"""
+        geo = self.geo
+        for lines, other, cross in ((self.rows, geo.col_of, self.cols), (self.cols, geo.row_of, self.rows)):
+            for _, bit in self.digit_bits:
+                pairs = {}
+                for unit in lines:
+                    cells = self._positions(unit, bit)
+                    if len(cells) == 2:
+                        key = (other[cells[0]], other[cells[1]])
+                        if key in pairs:
+                            wing = set(cells) | set(pairs[key])
+                            targets = [i for a in key for i in cross[a] if i not in wing]
+                            if self.eliminate(targets, bit):
+                                return 1
+                        else:
+                            pairs[key] = cells
+        return 0
+
+    def solve_logically(self) -> Rating:
+        """Apply techniques until solved or stuck"""
+        steps: Dict[str, int] = {}
+        hardest = -1
+        methods = [getattr(self, name) for name, _ in TECHNIQUES]
+        while self.empty:
+            for rank, method in enumerate(methods):
+                applied = method()
+                if applied:
+                    name = TECHNIQUES[rank][0]
+                    steps[name] = steps.get(name, 0) + applied
+                    hardest = max(hardest, rank)
+                    break
+            else:
+                break
+        solved = not self.empty
+        if not solved:
+            level = "expert"
+        else:
+            level = TECHNIQUES[hardest][1] if hardest >= 0 else "easy"
+        return Rating(level, TECHNIQUES[hardest][0] if hardest >= 0 else None, solved, steps)
+
+
+def rate(board: List[List[int]]) -> Rating:
+    """Rate a puzzle by the hardest technique needed to solve it; raises Contradiction on broken grids"""
+    return CandidateGrid(board).solve_logically()
+
+
+class LogicalSolver(SolverEngine):
+    """Solve with human techniques first, falling back to MRV search when logic gets stuck"""
+
+    name = "logic"
+
+    def __init__(self, fallback: Optional[SolverEngine] = None):
+        self.fallback = fallback or MRVSolver()
+
+    def _reduce(self, board: List[List[int]]) -> Optional[CandidateGrid]:
+        try:
+            grid = CandidateGrid(board)
+            grid.solve_logically()
+        except Contradiction:
+            return None
+        return grid
+
+    def solve(self, board: List[List[int]], budget: Optional[SearchBudget] = None) -> bool:
+        grid = self._reduce(board)
+        if grid is None:
+            return False
+        reduced = grid.to_board()
+        if grid.empty and not self.fallback.solve(reduced, budget):
+            return False
+        for r, row in enumerate(reduced):
+            for c, num in enumerate(row):
+                board[r][c] = num
+        return True
+
+    def count_solutions(self, board: List[List[int]], limit: int = 2, budget: Optional[SearchBudget] = None) -> int:
+        # Logical deductions never remove a solution, so counting can start from the reduced grid
+        grid = self._reduce(board)
+        if grid is None:
+            return 0
+        if not grid.empty:
+            return 1
+        return self.fallback.count_solutions(grid.to_board(), limit, budget)
+
+
+register_engine(LogicalSolver())
@@ -0,0 +1,191 @@
+"""
+Optional instrumentation for the solver, the generator and the web routes.
+
+Counters and latency histograms live in one process-wide Registry and are
+rendered in the Prometheus text format for a /metrics route. Recording is
+off unless SUDOKU_METRICS=1 is set or the registry is enabled in code;
+while off, the hot paths pay one attribute check per call. profile()
+switches recording on for a block and reports what the block did:
+
+    with profile() as stats:
+        game.new_game("hard")
+    print(stats.counters["sudoku_search_nodes_total"], stats.timings)
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Iterator, List, Optional, Tuple
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# name -> (type, help text)
+METRICS = {
+    "sudoku_search_nodes_total": ("counter", "Search nodes visited by the solver engines"),
+    "sudoku_search_backtracks_total": ("counter", "Branches the solver engines abandoned"),
+    "sudoku_user_move_checks_total": ("counter", "Player moves checked by SudokuGame.is_valid_move "
+                                                  "(the solver engines do not call it)"),
+    "sudoku_operation_seconds": ("histogram", "Wall time of solving and generation steps"),
+    "sudoku_http_request_seconds": ("histogram", "Request latency per route"),
+}
+# Upper bounds in seconds, from a cached request up to a stalled 25x25 generation
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram"""
+
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # the last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class Registry:
+    """Process-wide counters and histograms"""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+
+    def inc(self, name: str, amount: float = 1, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self) -> Tuple[Dict[Tuple[str, Labels], float], Dict[Tuple[str, Labels], Tuple[int, float]]]:
+        """Counter values and (count, sum) per histogram"""
+        with self._lock:
+            return (dict(self.counters),
+                    {key: (histogram.count, histogram.total) for key, histogram in self.histograms.items()})
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            lines: List[str] = []
+            for name, (kind, help_text) in METRICS.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                if kind == "counter":
+                    samples = {labels: value for (metric, labels), value in self.counters.items() if metric == name}
+                    for labels, value in sorted(samples.items()) or [((), 0)]:
+                        lines.append(f"{name}{_format_labels(labels)} {value:g}")
+                    continue
+                for (metric, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(BUCKETS + (float("inf"),), histogram.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                        lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {histogram.total:g}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+            return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+registry = Registry(enabled=os.environ.get("SUDOKU_METRICS", "") not in ("", "0"))
+
+
+def timed(operation: str):
+    """Decorator recording a function's wall time under sudoku_operation_seconds{operation=...}"""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not registry.enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                registry.observe("sudoku_operation_seconds", time.perf_counter() - start, operation=operation)
+        return wrapper
+    return decorate
+
+
+class Profile:
+    """What a profile() block did: counter increments and (calls, seconds) per operation"""
+
+    def __init__(self):
+        self.counters: Dict[str, float] = {name: 0 for name, (kind, _) in METRICS.items() if kind == "counter"}
+        self.timings: Dict[str, Tuple[int, float]] = {}
+
+
+@contextmanager
+def profile() -> Iterator[Profile]:
+    """Record metrics for the duration of a block and collect its share of them.
+
+    Other threads recording at the same time are counted too.
+    """
+    result = Profile()
+    was_enabled = registry.enabled
+    registry.enabled = True
+    counters_before, histograms_before = registry.snapshot()
+    try:
+        yield result
+    finally:
+        registry.enabled = was_enabled
+        counters_after, histograms_after = registry.snapshot()
+        for (name, labels), value in counters_after.items():
+            delta = value - counters_before.get((name, labels), 0)
+            if delta:
+                result.counters[name] += delta
+        for (name, labels), (count, total) in histograms_after.items():
+            count_before, total_before = histograms_before.get((name, labels), (0, 0.0))
+            if name == "sudoku_operation_seconds" and count > count_before:
+                result.timings[dict(labels)["operation"]] = (count - count_before, total - total_before)
+
+
+def instrument_flask(app, route: Optional[str] = "/metrics"):
+    """Record per-route latency for a Flask app and serve the registry at route (None to not serve it)"""
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record_latency(response):
+        start = g.pop("metrics_start", None)
+        if registry.enabled and start is not None:
+            rule = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            registry.observe("sudoku_http_request_seconds", time.perf_counter() - start,
+                             route=rule, method=request.method, status=str(response.status_code))
+        return response
+
+    if route:
+        app.add_url_rule(route, "metrics", lambda: app.response_class(registry.render(), content_type=CONTENT_TYPE))
+    return app
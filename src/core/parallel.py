@@ -0,0 +1,247 @@
+"""
+Parallel search for hard puzzles across a process pool.
+
+The coordinator searches split_nodes nodes in-process first, which settles
+most puzzles before the pool is ever started. What is left open is split
+breadth-first until there are a few subtrees per worker and queued on the
+pool. A worker searches a subtree for at most split_nodes nodes and hands
+back whatever it left unsearched, which is queued behind the rest: big
+branches keep being broken up, so idle workers always find work and no
+node is searched twice. The first solution (or, when counting, reaching
+the limit) stops every worker through a shared event.
+
+Only worth it for puzzles that keep the MRV engine busy for well over a
+tenth of a second.
+
+    with ParallelSolver(workers=32) as engine:
+        SudokuGame(engine=engine).solve_sudoku(board)
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import List, Optional, Tuple
+
+try:
+    from .solvers import SearchBudget, SearchBudgetExceeded, SolverEngine, _SearchState, _report_search
+    from .metrics import registry as metrics
+except ImportError:
+    from solvers import SearchBudget, SearchBudgetExceeded, SolverEngine, _SearchState, _report_search
+    from metrics import registry as metrics
+
+# Set by the coordinator to stop every worker's current subtree
+_cancel = None
+
+Subtree = List[int]  # flat cells, 0 = empty
+# (solutions found, the first solution, subtrees left unsearched, nodes searched, backtracks)
+SubtreeResult = Tuple[int, Optional[Subtree], List[Subtree], int, int]
+
+
+def _init_worker(cancel):
+    global _cancel
+    _cancel = cancel
+
+
+def _rows(cells: Subtree, size: int) -> List[List[int]]:
+    return [cells[r * size:r * size + size] for r in range(size)]
+
+
+def _search_subtree(size: int, cells: Subtree, limit: int, budget: SearchBudget) -> SubtreeResult:
+    """Depth-first MRV search of one subtree until it is done or budget's nodes run out.
+
+    Returns (solutions found up to limit, the first one when limit is 1, the
+    subtrees left unsearched, nodes charged, branches abandoned, counted as
+    MRVSolver counts them). The unsearched subtrees are the
+    node that was next plus every untried candidate on the path to it, so
+    stopping early loses no work. A deadline or cancellation still raises.
+    """
+    state = _SearchState(_rows(cells, size))
+    if state.conflict:
+        return 0, None, [], 0, 0
+    found, solution = 0, None
+    # One frame per branching cell on the current path: [cell, untried candidates, trail length before them]
+    stack = []
+    try:
+        while True:
+            budget.charge()
+            descended = False
+            if state.propagate():
+                best, cand = state.most_constrained()
+                if best >= 0:
+                    stack.append([best, cand, len(state.trail)])
+                    descended = True
+                else:
+                    found += 1
+                    if limit == 1:
+                        solution = state.cells[:]
+                    if found >= limit:
+                        return found, solution, [], budget.nodes, state.backtracks
+            if not descended and stack:
+                state.backtracks += 1  # the candidate that led here
+            while stack and not stack[-1][1]:
+                stack.pop()
+                if stack:
+                    state.backtracks += 1  # the candidate that led to the exhausted cell
+            if not stack:
+                return found, solution, [], budget.nodes, state.backtracks
+            frame = stack[-1]
+            state.undo(frame[2])
+            bit = frame[1] & -frame[1]
+            frame[1] ^= bit
+            state.place(frame[0], bit.bit_length() - 1)
+    except SearchBudgetExceeded as e:
+        if e.reason != "nodes":
+            raise
+    unsearched = [state.cells[:]]
+    for best, cand, mark in reversed(stack):
+        state.undo(mark)
+        while cand:
+            bit = cand & -cand
+            cand ^= bit
+            child = state.cells[:]
+            child[best] = bit.bit_length() - 1
+            unsearched.append(child)
+    return found, solution, unsearched, budget.nodes, state.backtracks
+
+
+def _explore(size: int, cells: Subtree, limit: int, max_nodes: int) -> SubtreeResult:
+    """_search_subtree in a worker process, giving up quietly when the coordinator cancels"""
+    budget = SearchBudget(max_nodes, cancel=_cancel)
+    try:
+        return _search_subtree(size, cells, limit, budget)
+    except SearchBudgetExceeded:
+        return 0, None, [], budget.nodes, 0
+
+
+class ParallelSolver(SolverEngine):
+    """MRV search split across worker processes; returns the same answers as MRVSolver, though a
+    puzzle with several solutions may be solved to a different one.
+
+    The pool is started on first use and kept until close(). One instance
+    runs one search at a time; concurrent calls from several threads wait
+    their turn.
+    """
+
+    name = "parallel"
+    SUBTREES_PER_WORKER = 4
+    SPLIT_NODES = 5000  # roughly 50 ms of MRV search
+
+    def __init__(self, workers: Optional[int] = None, split_nodes: int = SPLIT_NODES):
+        self.workers = workers or os.cpu_count() or 1
+        self.split_nodes = split_nodes
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._cancel = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Shut the worker processes down"""
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def solve(self, board: List[List[int]], budget: Optional[SearchBudget] = None) -> bool:
+        found, solution = self._search(board, 1, budget)
+        if not found:
+            return False
+        size = len(board)
+        for i, num in enumerate(solution):
+            board[i // size][i % size] = num
+        return True
+
+    def count_solutions(self, board: List[List[int]], limit: int = 2, budget: Optional[SearchBudget] = None) -> int:
+        return self._search(board, limit, budget)[0]
+
+    def pool(self) -> ProcessPoolExecutor:
+        """The worker pool, started on first use. Other tasks may be submitted to it too, sharing
+        its processes with the search (they queue ahead of any search submitted after them)."""
+        if self._executor is None:
+            context = multiprocessing.get_context()
+            self._cancel = context.Event()
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=context, initializer=_init_worker,
+                                                 initargs=(self._cancel,))
+        return self._executor
+
+    def _search(self, board: List[List[int]], limit: int,
+                budget: Optional[SearchBudget]) -> Tuple[int, Optional[Subtree]]:
+        """(solutions found up to limit, the first one as flat cells)"""
+        with self._lock:
+            size = len(board)
+            # Search in-process first: most puzzles are done within split_nodes and never start the pool
+            found, solution, frontier, _, _ = self._inline(size, [num for row in board for num in row], limit,
+                                                           self.split_nodes, budget)
+            frontier = deque(frontier)
+            # Then split breadth-first until every worker has a few subtrees to start on
+            while found < limit and frontier and len(frontier) < self.workers * self.SUBTREES_PER_WORKER:
+                count, cells, children, _, _ = self._inline(size, frontier.popleft(), limit - found, 1, budget)
+                found += count
+                solution = solution or cells
+                frontier.extend(children)
+            if found >= limit or not frontier:
+                return min(found, limit), solution
+
+            pool = self.pool()
+            pending = {pool.submit(_explore, size, cells, limit - found, self.split_nodes) for cells in frontier}
+            try:
+                while pending:
+                    timeout = None
+                    if budget is not None:
+                        if budget.deadline is not None:
+                            timeout = max(budget.deadline - time.monotonic(), 0)
+                        elif budget.cancel is not None:
+                            timeout = 0.05
+                    done, pending = wait(pending, timeout, FIRST_COMPLETED)
+                    for future in done:
+                        count, cells, unsearched, searched, backtracks = future.result()
+                        if metrics.enabled:
+                            _report_search(searched, backtracks)
+                        if budget is not None:
+                            budget.spend(searched)
+                        found += count
+                        solution = solution or cells
+                        if found >= limit:
+                            # Subtrees running side by side can overshoot between them
+                            return limit, solution
+                        pending.update(pool.submit(_explore, size, child, limit - found, self.split_nodes)
+                                       for child in unsearched)
+                    if budget is not None:
+                        budget.check()
+            finally:
+                if pending:
+                    self._stop(pending)
+            return found, solution
+
+    def _inline(self, size: int, cells: Subtree, limit: int, max_nodes: int,
+                budget: Optional[SearchBudget]) -> SubtreeResult:
+        part = budget.limited(max_nodes) if budget is not None else SearchBudget(max_nodes)
+        backtracks = 0
+        try:
+            result = _search_subtree(size, cells, limit, part)
+            backtracks = result[4]
+            return result
+        finally:
+            if metrics.enabled:
+                _report_search(part.nodes, backtracks)
+            if budget is not None:
+                budget.spend(part.nodes)
+
+    def _stop(self, pending):
+        """Cancel queued subtrees and wait for the running ones to notice the event"""
+        self._cancel.set()
+        for future in pending:
+            future.cancel()
+        wait(pending)
+        self._cancel.clear()
+        if metrics.enabled:
+            # Work the stopped subtrees did before noticing still counts
+            for future in pending:
+                if not future.cancelled() and future.exception() is None:
+                    _report_search(*future.result()[3:])
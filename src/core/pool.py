@@ -0,0 +1,154 @@
+import random
+import threading
+from collections import deque
+from math import isqrt
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+try:
+    from .sudoku import SudokuGame
+    from .codec import SEED_BITS, TRANSFORM_BITS, decode_puzzle_id, encode_puzzle_id
+    from .transforms import apply_transform, random_transform
+except ImportError:
+    from sudoku import SudokuGame
+    from codec import SEED_BITS, TRANSFORM_BITS, decode_puzzle_id, encode_puzzle_id
+    from transforms import apply_transform, random_transform
+
+Puzzle = Tuple[List[List[int]], List[List[int]], Optional[str]]
+
+
+class PuzzlePool:
+    """Per-difficulty pool of pre-generated (puzzle, solution, puzzle ID) triples.
+
+    take() pops a ready puzzle in O(1). Whenever a difficulty drops to
+    low_water or below, a background thread tops it back up to size. Pass
+    the pool as SudokuGame.new_game(difficulty, source=pool); an empty pool
+    makes new_game fall back to inline generation.
+    """
+
+    def __init__(self, difficulties: Iterable[str] = ("easy", "medium", "hard"),
+                 size: int = 10, low_water: int = 3, engine=None, start: bool = True, box_size: int = 3):
+        if size < 1 or not 0 <= low_water < size:
+            raise ValueError("PuzzlePool needs size >= 1 and 0 <= low_water < size")
+        self.size = size
+        self.low_water = low_water
+        self.engine = engine
+        self.box_size = box_size
+        self._pools: Dict[str, Deque[Puzzle]] = {difficulty: deque() for difficulty in difficulties}
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+        if start:
+            self.start()
+
+    def start(self):
+        """Start the background refill thread (idempotent)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped = False
+            self._thread = threading.Thread(target=self._refill_loop, name="sudoku-pool-refill", daemon=True)
+            self._thread.start()
+            self._wakeup.set()
+
+    def stop(self):
+        """Stop the background refill thread"""
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def take(self, difficulty: str) -> Optional[Puzzle]:
+        """Pop a (puzzle, solution, puzzle ID) triple, or None if none is ready"""
+        pool = self._pools.get(difficulty)
+        if pool is None:
+            return None
+        try:
+            puzzle = pool.popleft()
+        except IndexError:
+            puzzle = None
+        if len(pool) <= self.low_water:
+            self._wakeup.set()
+        return puzzle
+
+    def fill(self, difficulty: Optional[str] = None):
+        """Synchronously top up one difficulty (or all of them) to size"""
+        game = SudokuGame(engine=self.engine, box_size=self.box_size)
+        for name in ([difficulty] if difficulty else list(self._pools)):
+            pool = self._pools[name]
+            while len(pool) < self.size and not self._stopped:
+                pool.append(self._generate(game, name))
+
+    def levels(self) -> Dict[str, int]:
+        """Number of ready puzzles per difficulty"""
+        return {difficulty: len(pool) for difficulty, pool in self._pools.items()}
+
+    def _generate(self, game: SudokuGame, difficulty: str) -> Puzzle:
+        game.new_game(difficulty)
+        return game.board, game.solution, game.puzzle_id
+
+    def _refill_loop(self):
+        game = SudokuGame(engine=self.engine, box_size=self.box_size)
+        while not self._stopped:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            # Serve the emptiest difficulty first, one puzzle at a time
+            while not self._stopped:
+                difficulty, pool = min(self._pools.items(), key=lambda item: len(item[1]))
+                if len(pool) >= self.size:
+                    break
+                pool.append(self._generate(game, difficulty))
+
+
+class VariantSource:
+    """Puzzle source dealing random symmetry variants (see core.transforms) of a few base puzzles.
+
+    Each base puzzle comes from source.take(difficulty), e.g. a PuzzleBank,
+    which this turns into a practically endless supply. Without a source, a
+    base is generated here and reused for reuse variants before the next
+    one is generated. Either way take() is usually a transform and a copy,
+    microseconds instead of a search. Variants of generated puzzles get
+    their own puzzle IDs; variants of ID-less (banked) puzzles have none.
+    """
+
+    def __init__(self, source=None, box_size: int = 3, reuse: int = 100, rng: Optional[random.Random] = None):
+        if reuse < 1:
+            raise ValueError("VariantSource needs reuse >= 1")
+        self.source = source
+        self.box_size = box_size
+        self.reuse = reuse
+        self.rng = rng or random.Random()
+        self._game: Optional[SudokuGame] = None
+        self._bases: Dict[str, Tuple[tuple, int]] = {}  # difficulty -> (base puzzle, variants left)
+        self._lock = threading.Lock()
+
+    def take(self, difficulty: str) -> Optional[Puzzle]:
+        """A fresh variant as a (puzzle, solution, puzzle ID) triple, or None if the source has nothing"""
+        base = self._base(difficulty)
+        if base is None:
+            return None
+        puzzle, solution = base[:2]
+        seed = self.rng.getrandbits(TRANSFORM_BITS)
+        transform = random_transform(isqrt(len(puzzle)), random.Random(seed))
+        return (apply_transform(puzzle, transform), apply_transform(solution, transform),
+                self._variant_id(base[2] if len(base) > 2 else None, seed))
+
+    def _base(self, difficulty: str) -> Optional[tuple]:
+        if self.source is not None:
+            return self.source.take(difficulty)
+        with self._lock:
+            base, left = self._bases.get(difficulty, (None, 0))
+            if not left:
+                if self._game is None:
+                    self._game = SudokuGame(box_size=self.box_size, seed=self.rng.getrandbits(SEED_BITS))
+                self._game.new_game(difficulty)
+                base, left = (self._game.board, self._game.solution, self._game.puzzle_id), self.reuse
+            self._bases[difficulty] = (base, left - 1)
+            return base
+
+    @staticmethod
+    def _variant_id(base_id: Optional[str], transform: int) -> Optional[str]:
+        if base_id is None:
+            return None
+        box_size, difficulty, seed, base_transform = decode_puzzle_id(base_id)
+        if base_transform is not None:
+            return None  # a variant of a variant is not named by a single transform seed
+        return encode_puzzle_id(box_size, difficulty, seed, transform)
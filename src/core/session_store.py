@@ -0,0 +1,232 @@
+"""
+Session stores for per-player game state.
+
+Values are the packed state strings produced by core.codec, keyed by the
+client's session id. MemorySessionStore lives in one process;
+SQLiteSessionStore is shared by every process on the host, so the web app
+can run under a multi-process WSGI server. make_store() picks a backend
+from a URL such as "memory" or "sqlite:////tmp/sudoku.db".
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+
+class SessionStore:
+    """Interface shared by the session store backends"""
+
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def update(self, key: str, fn: Callable[[Optional[str]], Optional[str]]) -> Optional[str]:
+        """Atomically replace the value for key with fn(current value or None).
+
+        If fn returns None the entry is left untouched. Returns the stored value.
+        fn runs with the key locked (in SQLite, the whole database), so do any
+        slow work, such as generating a puzzle, before calling update().
+        """
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, int]:
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """In-process store bounded by entry count and total size, with LRU eviction and per-entry TTL.
+
+    max_bytes counts the lengths of keys and values, which for packed game
+    states is a close proxy for their memory footprint.
+    """
+
+    def __init__(self, max_entries: int = 10000, max_bytes: Optional[int] = None, ttl: Optional[float] = 3600,
+                 clock: Callable[[], float] = time.monotonic):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        # key -> (value, expiry); ordered from least to most recently used
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # key -> [lock, number of update() calls holding or waiting for it]; dropped when unused
+        self._update_locks: Dict[str, list] = {}
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expiry = entry
+            if expiry <= self.clock():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: str):
+        expiry = self.clock() + self.ttl if self.ttl is not None else float("inf")
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expiry)
+            self._bytes += len(key) + len(value)
+            while len(self._entries) > self.max_entries or (self.max_bytes is not None and
+                                                            self._bytes > self.max_bytes and len(self._entries) > 1):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def update(self, key: str, fn: Callable[[Optional[str]], Optional[str]]) -> Optional[str]:
+        with self._lock:
+            entry = self._update_locks.get(key)
+            if entry is None:
+                entry = self._update_locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                value = fn(self.get(key))
+                if value is not None:
+                    self.set(key, value)
+                return value
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._update_locks[key]
+
+    def purge_expired(self) -> int:
+        """Drop every expired entry; returns how many were dropped"""
+        now = self.clock()
+        with self._lock:
+            expired = [key for key, (_, expiry) in self._entries.items() if expiry <= now]
+            for key in expired:
+                self._remove(key)
+            self.expirations += len(expired)
+        return len(expired)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, key: str):
+        value, _ = self._entries.pop(key)
+        self._bytes -= len(key) + len(value)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Session store in a SQLite database in WAL mode, shared by all processes on the host.
+
+    Each thread gets its own connection. update() runs its read and write in
+    one BEGIN IMMEDIATE transaction, so concurrent moves on the same session
+    from different worker processes are serialized rather than lost.
+    """
+
+    _SCHEMA = "CREATE TABLE IF NOT EXISTS sessions (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+    _PURGE_EVERY = 1000
+
+    def __init__(self, path: str, ttl: Optional[float] = 3600, timeout: float = 5.0):
+        self.path = path
+        self.ttl = ttl
+        self.timeout = timeout
+        self._local = threading.local()
+        self._writes = 0
+        self.hits = self.misses = 0
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(self._SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            # Connections must not be shared across threads or forked processes
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _expiry(self) -> float:
+        return time.time() + self.ttl if self.ttl is not None else float("inf")
+
+    def _get(self, conn: sqlite3.Connection, key: str) -> Optional[str]:
+        row = conn.execute("SELECT value FROM sessions WHERE key = ? AND expires > ?", (key, time.time())).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def _set(self, conn: sqlite3.Connection, key: str, value: str):
+        conn.execute("INSERT OR REPLACE INTO sessions (key, value, expires) VALUES (?, ?, ?)",
+                     (key, value, self._expiry()))
+        self._writes += 1
+        if self._writes % self._PURGE_EVERY == 0:
+            conn.execute("DELETE FROM sessions WHERE expires <= ?", (time.time(),))
+
+    def get(self, key: str) -> Optional[str]:
+        return self._get(self._conn(), key)
+
+    def set(self, key: str, value: str):
+        self._set(self._conn(), key, value)
+
+    def delete(self, key: str):
+        self._conn().execute("DELETE FROM sessions WHERE key = ?", (key,))
+
+    def update(self, key: str, fn: Callable[[Optional[str]], Optional[str]]) -> Optional[str]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            value = fn(self._get(conn, key))
+            if value is not None:
+                self._set(conn, key, value)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return value
+
+    def stats(self) -> Dict[str, int]:
+        entries = self._conn().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        return {"entries": entries, "hits": self.hits, "misses": self.misses}
+
+
+def make_store(url: str = "memory", max_entries: int = 10000, max_bytes: Optional[int] = None,
+               ttl: Optional[float] = 3600) -> SessionStore:
+    """Build a store from "memory" or "sqlite:///<path>" (size limits apply to the memory store)"""
+    if url == "memory":
+        return MemorySessionStore(max_entries=max_entries, max_bytes=max_bytes, ttl=ttl)
+    if url.startswith("sqlite:///"):
+        return SQLiteSessionStore(url[len("sqlite:///"):], ttl=ttl)
+    raise ValueError(f"Unknown session store URL: {url!r}")
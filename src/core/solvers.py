@@ -0,0 +1,470 @@
+import threading
+import time
+from math import isqrt
+from typing import Dict, List, Optional, Tuple, Union
+
+try:
+    from .board import FlatBoard
+    from .metrics import registry as metrics
+except ImportError:
+    from board import FlatBoard
+    from metrics import registry as metrics
+
+
+class Geometry:
+    """Flat-index lookup tables for an N²×N² board with N×N boxes; cell index i = row * size + col"""
+
+    __slots__ = ("box_size", "size", "cells", "row_of", "col_of", "box_of", "units", "units_of", "peers",
+                 "all_digits")
+
+    def __init__(self, box_size: int):
+        if box_size < 1:
+            raise ValueError("box size must be at least 1")
+        n = box_size
+        size = n * n
+        self.box_size = n
+        self.size = size
+        self.cells = size * size
+        self.row_of = [i // size for i in range(self.cells)]
+        self.col_of = [i % size for i in range(self.cells)]
+        self.box_of = [(i // (size * n)) * n + (i % size) // n for i in range(self.cells)]
+        self.units = ([[r * size + c for c in range(size)] for r in range(size)] +
+                      [[r * size + c for r in range(size)] for c in range(size)] +
+                      [[(b // n) * size * n + (b % n) * n + (k // n) * size + k % n for k in range(size)]
+                       for b in range(size)])
+        self.units_of = [(self.row_of[i], size + self.col_of[i], 2 * size + self.box_of[i])
+                         for i in range(self.cells)]
+        self.peers = [sorted({j for u in self.units_of[i] for j in self.units[u]} - {i}) for i in range(self.cells)]
+        self.all_digits = ((1 << size) - 1) << 1  # bits 1..size
+
+
+_GEOMETRIES: Dict[int, Geometry] = {}
+
+
+def geometry(box_size: int = 3) -> Geometry:
+    """Shared lookup tables for a box size"""
+    geo = _GEOMETRIES.get(box_size)
+    if geo is None:
+        geo = _GEOMETRIES[box_size] = Geometry(box_size)
+    return geo
+
+
+def geometry_of(board: List[List[int]]) -> Geometry:
+    """Lookup tables matching a board's size (9x9 -> box size 3, 16x16 -> 4, ...)"""
+    box_size = isqrt(len(board))
+    if box_size * box_size != len(board) or box_size < 1:
+        raise ValueError(f"a board must be N²×N², got {len(board)} rows")
+    return geometry(box_size)
+
+
+# Tables for the classic 9x9 board
+_CLASSIC = geometry(3)
+ROW_OF = _CLASSIC.row_of
+COL_OF = _CLASSIC.col_of
+BOX_OF = _CLASSIC.box_of
+UNITS = _CLASSIC.units
+UNITS_OF = _CLASSIC.units_of
+PEERS = _CLASSIC.peers
+ALL_DIGITS = _CLASSIC.all_digits  # bits 1..9
+
+
+def compute_masks(board: List[List[int]]) -> Tuple[List[int], List[int], List[int]]:
+    """Build per-row, per-column and per-box bitmasks (bit n set = digit n used)"""
+    size = len(board)
+    geo = geometry_of(board)
+    n = geo.box_size
+    rows, cols, boxes = [0] * size, [0] * size, [0] * size
+    if isinstance(board, FlatBoard):
+        row_of, col_of, box_of = geo.row_of, geo.col_of, geo.box_of
+        for i, num in enumerate(board.cells):
+            if num:
+                bit = 1 << num
+                rows[row_of[i]] |= bit
+                cols[col_of[i]] |= bit
+                boxes[box_of[i]] |= bit
+        return rows, cols, boxes
+    for i in range(size):
+        for j in range(size):
+            num = board[i][j]
+            if num:
+                bit = 1 << num
+                rows[i] |= bit
+                cols[j] |= bit
+                boxes[(i // n) * n + j // n] |= bit
+    return rows, cols, boxes
+
+
+class SearchBudgetExceeded(Exception):
+    """A search ran out of nodes or time, or was cancelled, before reaching an answer"""
+
+    def __init__(self, reason: str):
+        super().__init__(f"search budget exceeded: {reason}")
+        self.reason = reason  # "nodes", "deadline" or "cancelled"
+
+
+class SearchBudget:
+    """Limits shared by every search it is passed to.
+
+    max_nodes caps the search nodes visited, timeout (seconds from now) sets a
+    wall-clock deadline and cancel is an Event another thread can set to stop
+    the search. Nodes are charged one at a time; the clock and the event are
+    read every CHECK_EVERY nodes, so stopping lags by at most that many nodes.
+    """
+
+    CHECK_EVERY = 64
+
+    __slots__ = ("max_nodes", "deadline", "cancel", "nodes")
+
+    def __init__(self, max_nodes: Optional[int] = None, timeout: Optional[float] = None,
+                 cancel: Optional[threading.Event] = None):
+        self.max_nodes = max_nodes
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+        self.cancel = cancel
+        self.nodes = 0
+
+    def charge(self):
+        """Count one search node; raises SearchBudgetExceeded once a limit is passed"""
+        self.nodes += 1
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            raise SearchBudgetExceeded("nodes")
+        if not self.nodes % self.CHECK_EVERY:
+            self.check()
+
+    def check(self):
+        """Raise SearchBudgetExceeded if the deadline has passed or the search was cancelled"""
+        if self.cancel is not None and self.cancel.is_set():
+            raise SearchBudgetExceeded("cancelled")
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise SearchBudgetExceeded("deadline")
+
+    def limited(self, max_nodes: int) -> "SearchBudget":
+        """A budget of at most max_nodes of this one's remaining nodes, with the same deadline and
+        cancellation; pass the nodes it used to spend() when done"""
+        remaining = max_nodes if self.max_nodes is None else min(max_nodes, self.max_nodes - self.nodes)
+        part = SearchBudget(max(remaining, 0), cancel=self.cancel)
+        part.deadline = self.deadline
+        return part
+
+    def spend(self, nodes: int):
+        """Charge nodes searched elsewhere (by a limited() part or another process); raises
+        SearchBudgetExceeded if that overdrew this budget"""
+        self.nodes += nodes
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            raise SearchBudgetExceeded("nodes")
+
+
+class SolverEngine:
+    """Base class for solver engines.
+
+    An engine fills an N²×N² board (0 = empty; 9x9 for the classic game) in
+    place and reports whether a solution was found. Engines are stateless
+    between calls and can be shared. Given a SearchBudget, both methods raise
+    SearchBudgetExceeded when it runs out, leaving the board unchanged.
+    """
+
+    name = "base"
+
+    def solve(self, board: List[List[int]], budget: Optional[SearchBudget] = None) -> bool:
+        raise NotImplementedError
+
+    def count_solutions(self, board: List[List[int]], limit: int = 2, budget: Optional[SearchBudget] = None) -> int:
+        """Count solutions of board, stopping as soon as limit is reached; board is left unchanged"""
+        raise NotImplementedError
+
+
+class BacktrackingSolver(SolverEngine):
+    """Reference solver: first empty cell in row-major order, digits in ascending order"""
+
+    name = "backtracking"
+
+    def _empty_cells(self, board: List[List[int]]) -> List[Tuple[int, int, int]]:
+        n = geometry_of(board).box_size
+        return [(i, j, (i // n) * n + j // n) for i in range(len(board)) for j in range(len(board))
+                if board[i][j] == 0]
+
+    def solve(self, board: List[List[int]], budget: Optional[SearchBudget] = None) -> bool:
+        rows, cols, boxes = compute_masks(board)
+        empty_cells = self._empty_cells(board)
+        counts = [0, 0]  # search nodes, backtracks
+        try:
+            return self._backtrack(board, empty_cells, 0, rows, cols, boxes, budget, counts)
+        except SearchBudgetExceeded:
+            for i, j, _ in empty_cells:
+                board[i][j] = 0
+            raise
+        finally:
+            if metrics.enabled:
+                _report_search(*counts)
+
+    def count_solutions(self, board: List[List[int]], limit: int = 2, budget: Optional[SearchBudget] = None) -> int:
+        rows, cols, boxes = compute_masks(board)
+        work = [row[:] for row in board]
+        counts = [0, 0]
+        try:
+            return self._count(work, self._empty_cells(board), 0, rows, cols, boxes, limit, budget, counts)
+        finally:
+            if metrics.enabled:
+                _report_search(*counts)
+
+    def _backtrack(self, board: List[List[int]], empty_cells: List[Tuple[int, int, int]], index: int,
+                   rows: List[int], cols: List[int], boxes: List[int], budget: Optional[SearchBudget],
+                   counts: List[int]) -> bool:
+        """Fill empty_cells[index:] in row-major order, keeping the masks in step with the board"""
+        counts[0] += 1
+        if budget is not None:
+            budget.charge()
+        if index == len(empty_cells):
+            return True
+        i, j, b = empty_cells[index]
+        used = rows[i] | cols[j] | boxes[b]
+        for num in range(1, len(board) + 1):
+            bit = 1 << num
+            if not used & bit:
+                board[i][j] = num
+                rows[i] |= bit
+                cols[j] |= bit
+                boxes[b] |= bit
+                if self._backtrack(board, empty_cells, index + 1, rows, cols, boxes, budget, counts):
+                    return True
+                rows[i] ^= bit
+                cols[j] ^= bit
+                boxes[b] ^= bit
+                board[i][j] = 0
+                counts[1] += 1
+        return False
+
+    def _count(self, board: List[List[int]], empty_cells: List[Tuple[int, int, int]], index: int,
+               rows: List[int], cols: List[int], boxes: List[int], limit: int,
+               budget: Optional[SearchBudget], counts: List[int]) -> int:
+        counts[0] += 1
+        if budget is not None:
+            budget.charge()
+        if index == len(empty_cells):
+            return 1
+        i, j, b = empty_cells[index]
+        used = rows[i] | cols[j] | boxes[b]
+        found = 0
+        for num in range(1, len(board) + 1):
+            bit = 1 << num
+            if not used & bit:
+                board[i][j] = num
+                rows[i] |= bit
+                cols[j] |= bit
+                boxes[b] |= bit
+                found += self._count(board, empty_cells, index + 1, rows, cols, boxes, limit - found, budget,
+                                     counts)
+                rows[i] ^= bit
+                cols[j] ^= bit
+                boxes[b] ^= bit
+                board[i][j] = 0
+                if found >= limit:
+                    break
+                counts[1] += 1
+        return found
+
+
+class MRVSolver(SolverEngine):
+    """Constraint-propagating solver.
+
+    Applies naked and hidden singles to a fixpoint at every search node, then
+    branches on the empty cell with the fewest remaining candidates.
+    """
+
+    name = "mrv"
+
+    def solve(self, board: List[List[int]], budget: Optional[SearchBudget] = None) -> bool:
+        state = _SearchState(board, budget)
+        try:
+            solved = not state.conflict and state.search(1)
+        finally:
+            if metrics.enabled:
+                state.report()
+        if not solved:
+            return False
+        if isinstance(board, FlatBoard):
+            board.cells[:] = bytes(state.cells)
+            return True
+        size = len(board)
+        for i, num in enumerate(state.cells):
+            board[i // size][i % size] = num
+        return True
+
+    def count_solutions(self, board: List[List[int]], limit: int = 2, budget: Optional[SearchBudget] = None) -> int:
+        state = _SearchState(board, budget)
+        if state.conflict:
+            return 0
+        try:
+            return state.search(limit)
+        finally:
+            if metrics.enabled:
+                state.report()
+
+
+class _SearchState:
+    """Flat cells, digit masks and an undo trail for one MRVSolver run"""
+
+    __slots__ = ("geo", "cells", "rows", "cols", "boxes", "trail", "conflict", "nodes", "backtracks", "budget")
+
+    def __init__(self, board: List[List[int]], budget: Optional[SearchBudget] = None):
+        geo = self.geo = geometry_of(board)
+        self.budget = budget
+        size = geo.size
+        self.cells = list(board.cells) if isinstance(board, FlatBoard) else [num for row in board for num in row]
+        self.rows, self.cols, self.boxes = [0] * size, [0] * size, [0] * size
+        self.trail: List[int] = []
+        self.conflict = False
+        self.nodes = self.backtracks = 0
+        row_of, col_of, box_of = geo.row_of, geo.col_of, geo.box_of
+        for i, num in enumerate(self.cells):
+            if num:
+                bit = 1 << num
+                r, c, b = row_of[i], col_of[i], box_of[i]
+                if (self.rows[r] | self.cols[c] | self.boxes[b]) & bit:
+                    self.conflict = True
+                self.rows[r] |= bit
+                self.cols[c] |= bit
+                self.boxes[b] |= bit
+
+    def place(self, i: int, num: int):
+        bit = 1 << num
+        geo = self.geo
+        self.cells[i] = num
+        self.rows[geo.row_of[i]] |= bit
+        self.cols[geo.col_of[i]] |= bit
+        self.boxes[geo.box_of[i]] |= bit
+        self.trail.append(i)
+
+    def undo(self, mark: int):
+        cells, rows, cols, boxes, trail = self.cells, self.rows, self.cols, self.boxes, self.trail
+        row_of, col_of, box_of = self.geo.row_of, self.geo.col_of, self.geo.box_of
+        while len(trail) > mark:
+            i = trail.pop()
+            bit = ~(1 << cells[i])
+            rows[row_of[i]] &= bit
+            cols[col_of[i]] &= bit
+            boxes[box_of[i]] &= bit
+            cells[i] = 0
+
+    def propagate(self) -> bool:
+        """Apply naked and hidden singles until nothing changes; False on contradiction"""
+        cells, rows, cols, boxes = self.cells, self.rows, self.cols, self.boxes
+        geo = self.geo
+        row_of, col_of, box_of, all_digits = geo.row_of, geo.col_of, geo.box_of, geo.all_digits
+        progress = True
+        while progress:
+            progress = False
+            for unit in geo.units:
+                once = twice = placed = 0
+                for i in unit:
+                    num = cells[i]
+                    if num:
+                        placed |= 1 << num
+                        continue
+                    cand = all_digits & ~(rows[row_of[i]] | cols[col_of[i]] | boxes[box_of[i]])
+                    if not cand:
+                        return False
+                    if not cand & (cand - 1):
+                        # Naked single
+                        self.place(i, cand.bit_length() - 1)
+                        placed |= cand
+                        progress = True
+                        continue
+                    twice |= once & cand
+                    once |= cand
+                if (once | placed) != all_digits:
+                    return False
+                hidden = once & ~twice & ~placed
+                while hidden:
+                    bit = hidden & -hidden
+                    hidden ^= bit
+                    for i in unit:
+                        if not cells[i] and not (rows[row_of[i]] | cols[col_of[i]] | boxes[box_of[i]]) & bit:
+                            self.place(i, bit.bit_length() - 1)
+                            progress = True
+                            break
+        return True
+
+    def search(self, limit: int) -> int:
+        """Count solutions up to limit; the first solution is left in cells"""
+        self.nodes += 1
+        if self.budget is not None:
+            self.budget.charge()
+        mark = len(self.trail)
+        if not self.propagate():
+            self.undo(mark)
+            return 0
+
+        best, best_cand = self.most_constrained()
+        if best < 0:
+            return 1
+
+        found = 0
+        branch_mark = len(self.trail)
+        while best_cand:
+            bit = best_cand & -best_cand
+            best_cand ^= bit
+            self.place(best, bit.bit_length() - 1)
+            found += self.search(limit - found)
+            if found >= limit:
+                return found
+            self.undo(branch_mark)
+            self.backtracks += 1
+        self.undo(mark)
+        return found
+
+    def most_constrained(self) -> Tuple[int, int]:
+        """(cell, candidate mask) of the empty cell with the fewest candidates; cell is -1 if none is empty"""
+        cells, rows, cols, boxes = self.cells, self.rows, self.cols, self.boxes
+        geo = self.geo
+        row_of, col_of, box_of, all_digits = geo.row_of, geo.col_of, geo.box_of, geo.all_digits
+        best, best_cand, best_count = -1, 0, geo.size + 1
+        for i in range(geo.cells):
+            if not cells[i]:
+                cand = all_digits & ~(rows[row_of[i]] | cols[col_of[i]] | boxes[box_of[i]])
+                count = cand.bit_count()
+                if count < best_count:
+                    best, best_cand, best_count = i, cand, count
+                    if count == 2:
+                        break
+        return best, best_cand
+
+    def report(self):
+        """Add this run's node and backtrack counts to the metrics registry"""
+        _report_search(self.nodes, self.backtracks)
+
+
+def _report_search(nodes: int, backtracks: int):
+    """Add a search's node and backtrack counts to the metrics registry (every engine reports here)"""
+    metrics.inc("sudoku_search_nodes_total", nodes)
+    metrics.inc("sudoku_search_backtracks_total", backtracks)
+
+
+ENGINES: Dict[str, SolverEngine] = {
+    BacktrackingSolver.name: BacktrackingSolver(),
+    MRVSolver.name: MRVSolver(),
+}
+
+
+def solved_by_singles(board: List[List[int]]) -> bool:
+    """True if naked and hidden singles alone fill the board, which proves its solution unique"""
+    state = _SearchState(board)
+    return not state.conflict and state.propagate() and all(state.cells)
+
+
+def register_engine(engine: SolverEngine):
+    """Make an engine available by name to get_engine and SudokuGame(engine=...)"""
+    ENGINES[engine.name] = engine
+
+DEFAULT_ENGINE = MRVSolver.name
+
+
+def get_engine(engine: Union[str, SolverEngine, None] = None) -> SolverEngine:
+    """Resolve an engine name (or instance) to a solver engine"""
+    if engine is None:
+        engine = DEFAULT_ENGINE
+    if isinstance(engine, SolverEngine):
+        return engine
+    try:
+        return ENGINES[engine]
+    except KeyError:
+        raise ValueError(f"Unknown solver engine: {engine!r} (choose from {', '.join(ENGINES)})")
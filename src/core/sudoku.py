@@ -1,127 +1,500 @@
 import random
-import copy
-from typing import List, Tuple, Optional
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Tuple, Optional, Union
+
+try:
+    from .board import FlatBoard, as_flat
+    from .solvers import (DEFAULT_ENGINE, SearchBudget, SearchBudgetExceeded, SolverEngine, compute_masks, geometry,
+                          get_engine, solved_by_singles)
+    from .codec import (PUZZLE_DIFFICULTIES, SEED_BITS, decode_puzzle_id, decode_state, encode_puzzle_id,
+                        encode_state)
+    from .transforms import apply_transform, random_transform
+    from . import logical  # registers the "logic" engine
+    from .metrics import registry as metrics, timed
+except ImportError:
+    from board import FlatBoard, as_flat
+    from solvers import (DEFAULT_ENGINE, SearchBudget, SearchBudgetExceeded, SolverEngine, compute_masks, geometry,
+                         get_engine, solved_by_singles)
+    from codec import (PUZZLE_DIFFICULTIES, SEED_BITS, decode_puzzle_id, decode_state, encode_puzzle_id,
+                       encode_state)
+    from transforms import apply_transform, random_transform
+    import logical
+    from metrics import registry as metrics, timed
 
 
 class SudokuGame:
-    def __init__(self):
-        self.board = [[0 for _ in range(9)] for _ in range(9)]
-        self.solution = [[0 for _ in range(9)] for _ in range(9)]
-        
+    # How many recent cell changes are remembered for changed_since()
+    HISTORY = 32
+    # Share of the cells blanked per difficulty (40, 50 and 60 holes on a 9x9 board)
+    DIFFICULTY_HOLES = {
+        "easy": 40 / 81,
+        "medium": 50 / 81,
+        "hard": 60 / 81
+    }
+    # Search node caps per board cell (well above what typical searches need): a board fill that
+    # passes its cap is dealt again, and a removal whose uniqueness check passes its cap is undone,
+    # so no seed can stall generation
+    FILL_NODES_PER_CELL = 4
+    CHECK_NODES_PER_CELL = 20
+
+    def __init__(self, engine: Union[str, SolverEngine, None] = None, box_size: int = 3,
+                 seed: Optional[int] = None):
+        """engine: solver engine name ("mrv", "logic", "backtracking") or instance; defaults to "mrv".
+        box_size: N for an N²×N² board -- 3 for the classic 9x9, 2 for 4x4, 4 for 16x16, 5 for 25x25.
+        seed: seeds the game's own RNG, making its sequence of puzzles and hints reproducible"""
+        self.engine = get_engine(engine)
+        self.rng = random.Random(seed)
+        self.geometry = geometry(box_size)
+        self.box_size = box_size
+        self.size = box_size * box_size
+        # The board and solution start out empty and are only allocated if used before a puzzle is
+        # dealt or loaded, so restoring a saved game allocates them once
+        self._board: Optional[FlatBoard] = None
+        self._solution: Optional[FlatBoard] = None
+        self.row_masks, self.col_masks, self.box_masks = [0] * self.size, [0] * self.size, [0] * self.size
+        self._empty_count = self.size * self.size
+        self._empty_cells: Optional[List[Tuple[int, int]]] = None
+        self._empty_index: Dict[Tuple[int, int], int] = {}
+        # Bumped on every cell change and new puzzle; started is the version the puzzle was dealt at
+        self.version = 0
+        self.started = 0
+        self.changes: List[int] = []  # flat indices (row * size + col) of the latest changes, oldest first
+        self.puzzle_id: Optional[str] = None  # rebuilds the current puzzle; None if it has no ID
+
+    @property
+    def board(self) -> FlatBoard:
+        if self._board is None:
+            self._board = FlatBoard(self.size)
+        return self._board
+
+    @board.setter
+    def board(self, board: Union[FlatBoard, List[List[int]]]):
+        """Replace the board (nested lists are copied into a FlatBoard) and rebuild the digit masks"""
+        self._board = as_flat(board)
+        self.row_masks, self.col_masks, self.box_masks = compute_masks(self._board)
+        # Counted once here (a C-level byte count) and then kept up to date by set_cell
+        self._empty_count = self._board.cells.count(0)
+        # Empty cells as a list (for O(1) random choice) plus each cell's position in it (for O(1) removal);
+        # built on first use, since most requests restore a game and never ask for a hint
+        self._empty_cells = None
+        self._empty_index = {}
+
+    @property
+    def solution(self) -> FlatBoard:
+        if self._solution is None:
+            self._solution = FlatBoard(self.size)
+        return self._solution
+
+    @solution.setter
+    def solution(self, solution: Union[FlatBoard, List[List[int]]]):
+        self._solution = as_flat(solution)
+
+    def _empties(self) -> List[Tuple[int, int]]:
+        if self._empty_cells is None:
+            size = self.size
+            self._empty_cells = [divmod(i, size) for i, num in enumerate(self.board.cells) if not num]
+            self._empty_index = {cell: pos for pos, cell in enumerate(self._empty_cells)}
+        return self._empty_cells
+
+    @property
+    def empty_count(self) -> int:
+        """Number of empty cells on the board"""
+        return self._empty_count
+
+    def candidate_mask(self, row: int, col: int) -> int:
+        """Bitmask of digits (bit n = digit n) that could go at (row, col) given the current board"""
+        n = self.box_size
+        used = self.row_masks[row] | self.col_masks[col] | self.box_masks[(row // n) * n + col // n]
+        return ~used & self.geometry.all_digits
+
+    def candidates(self, row: int, col: int) -> List[int]:
+        """Digits that could go at (row, col) given the current board"""
+        mask = self.candidate_mask(row, col)
+        return [num for num in range(1, self.size + 1) if mask & (1 << num)]
+
     def is_valid_move(self, board: List[List[int]], row: int, col: int, num: int) -> bool:
         """Check if placing num at (row, col) is valid"""
+        if metrics.enabled:
+            metrics.inc("sudoku_user_move_checks_total")
+        n = self.box_size
+        if board is self._board:
+            used = self.row_masks[row] | self.col_masks[col] | self.box_masks[(row // n) * n + col // n]
+            return not used & (1 << num)
+
         # Check row
-        for j in range(9):
+        for j in range(self.size):
             if board[row][j] == num:
                 return False
         
         # Check column
-        for i in range(9):
+        for i in range(self.size):
             if board[i][col] == num:
                 return False
         
-        # Check 3x3 box
-        start_row, start_col = 3 * (row // 3), 3 * (col // 3)
-        for i in range(start_row, start_row + 3):
-            for j in range(start_col, start_col + 3):
+        # Check box
+        start_row, start_col = n * (row // n), n * (col // n)
+        for i in range(start_row, start_row + n):
+            for j in range(start_col, start_col + n):
                 if board[i][j] == num:
                     return False
         
         return True
     
-    def solve_sudoku(self, board: List[List[int]]) -> bool:
-        """Solve sudoku using backtracking"""
-        for i in range(9):
-            for j in range(9):
-                if board[i][j] == 0:
-                    for num in range(1, 10):
-                        if self.is_valid_move(board, i, j, num):
-                            board[i][j] = num
-                            if self.solve_sudoku(board):
-                                return True
-                            board[i][j] = 0
-                    return False
-        return True
+    @timed("solve_sudoku")
+    def solve_sudoku(self, board: List[List[int]], budget: Optional[SearchBudget] = None) -> bool:
+        """Solve sudoku in place with the game's solver engine.
+
+        Raises SearchBudgetExceeded, leaving the board unchanged, if budget runs out first.
+        """
+        solved = self.engine.solve(board, budget)
+        if board is self._board:
+            self.board = board
+        return solved
     
-    def generate_complete_board(self) -> List[List[int]]:
-        """Generate a complete valid Sudoku board"""
-        board = [[0 for _ in range(9)] for _ in range(9)]
-        
-        # Fill diagonal 3x3 boxes first
-        for box in range(0, 9, 3):
-            nums = list(range(1, 10))
-            random.shuffle(nums)
-            for i in range(3):
-                for j in range(3):
-                    board[box + i][box + j] = nums[i * 3 + j]
-        
-        # Solve the rest
-        self.solve_sudoku(board)
-        return board
+    @timed("generate_complete_board")
+    def generate_complete_board(self, rng: Optional[random.Random] = None,
+                                budget: Optional[SearchBudget] = None) -> FlatBoard:
+        """Generate a complete valid Sudoku board, drawing from rng (defaults to the game's RNG).
+
+        The board is always completed by the default engine, so the same RNG
+        state gives the same board whichever engine the game solves with.
+        Raises SearchBudgetExceeded if budget runs out first.
+        """
+        rng = rng or self.rng
+        filler = get_engine(DEFAULT_ENGINE)
+        n, size = self.box_size, self.size
+        fill_nodes = self.FILL_NODES_PER_CELL * size * size
+        while True:
+            board = FlatBoard(size)
+            
+            # Fill the diagonal boxes first: they share no row, column or box
+            for box in range(0, size, n):
+                nums = list(range(1, size + 1))
+                rng.shuffle(nums)
+                for i in range(n):
+                    start = (box + i) * size + box
+                    board.cells[start:start + n] = bytes(nums[i * n:i * n + n])
+            
+            # Solve the rest (on 4x4 some diagonal fillings have no completion, and a rare filling
+            # sends the search down a long dead end; deal again, which keeps the result seeded)
+            attempt = budget.limited(fill_nodes) if budget is not None else SearchBudget(fill_nodes)
+            try:
+                solved = filler.solve(board, attempt)
+            except SearchBudgetExceeded as e:
+                if e.reason != "nodes":
+                    raise
+                solved = False
+            finally:
+                if budget is not None:
+                    budget.spend(attempt.nodes)
+            if solved:
+                return board
     
-    def remove_numbers(self, board: List[List[int]], difficulty: str = "medium") -> List[List[int]]:
-        """Remove numbers from complete board to create puzzle"""
-        difficulty_levels = {
-            "easy": 40,
-            "medium": 50,
-            "hard": 60
-        }
-        
-        cells_to_remove = difficulty_levels.get(difficulty, 50)
-        puzzle = copy.deepcopy(board)
+    def count_solutions(self, board: List[List[int]], limit: int = 2, budget: Optional[SearchBudget] = None) -> int:
+        """Count solutions of board, stopping early once limit is reached"""
+        return self.engine.count_solutions(board, limit, budget)
+
+    def has_unique_solution(self, board: List[List[int]], budget: Optional[SearchBudget] = None) -> bool:
+        """Check that board has exactly one solution"""
+        return self.engine.count_solutions(board, 2, budget) == 1
+
+    @timed("remove_numbers")
+    def remove_numbers(self, board: List[List[int]], difficulty: str = "medium",
+                       rng: Optional[random.Random] = None, budget: Optional[SearchBudget] = None) -> FlatBoard:
+        """Remove numbers from complete board to create a puzzle with a unique solution.
+
+        Cells are blanked one at a time in random order (drawn from rng, or the
+        game's RNG) and a removal is kept only if the puzzle still has exactly
+        one solution, so sparse levels may end up with fewer holes than requested.
+        Raises SearchBudgetExceeded if budget runs out first.
+        """
+        share = self.DIFFICULTY_HOLES.get(difficulty, self.DIFFICULTY_HOLES["medium"])
+        cells_to_remove = round(share * self.size * self.size)
+        puzzle = FlatBoard.from_rows(board)
+        cells = puzzle.cells
         
-        cells = [(i, j) for i in range(9) for j in range(9)]
-        random.shuffle(cells)
+        order = list(range(self.size * self.size))
+        (rng or self.rng).shuffle(order)
         
-        for i, j in cells[:cells_to_remove]:
-            puzzle[i][j] = 0
+        removed = 0
+        for index in order:
+            if removed == cells_to_remove:
+                break
+            if budget is not None:
+                budget.check()
+            num = cells[index]
+            cells[index] = 0
+            if self._has_alternative(puzzle, index, num, budget):
+                cells[index] = num
+            else:
+                removed += 1
         
         return puzzle
     
-    def new_game(self, difficulty: str = "medium"):
-        """Generate a new Sudoku puzzle"""
-        complete_board = self.generate_complete_board()
-        self.solution = copy.deepcopy(complete_board)
-        self.board = self.remove_numbers(complete_board, difficulty)
+    def _has_alternative(self, puzzle: FlatBoard, index: int, num: int,
+                         budget: Optional[SearchBudget] = None) -> bool:
+        """Check whether puzzle, whose solution was unique before cell index was blanked, now
+        admits a solution with a digit other than num there (i.e. a second solution).
+        A check that passes its node cap counts as a yes, which keeps the clue."""
+        if self.box_size > 3:
+            # Refuting every alternative digit is far too slow from 16x16 up, so only removals that
+            # singles alone can undo are kept there; those are unique by construction
+            return not solved_by_singles(puzzle)
+        check_nodes = self.CHECK_NODES_PER_CELL * self.size * self.size
+        cells = puzzle.cells
+        used = 1 << num
+        for peer in self.geometry.peers[index]:
+            used |= 1 << cells[peer]
+        for alt in range(1, self.size + 1):
+            if not used & (1 << alt):
+                cells[index] = alt
+                check = budget.limited(check_nodes) if budget is not None else SearchBudget(check_nodes)
+                try:
+                    found = self.engine.count_solutions(puzzle, 1, check)
+                except SearchBudgetExceeded as e:
+                    if e.reason != "nodes":
+                        raise
+                    found = 1
+                finally:
+                    cells[index] = 0
+                    if budget is not None:
+                        budget.spend(check.nodes)
+                if found:
+                    return True
+        return False
+
+    def new_game(self, difficulty: str = "medium", source=None, seed: Optional[int] = None,
+                 budget: Optional[SearchBudget] = None):
+        """Generate a new Sudoku puzzle.
+
+        source: optional puzzle source with a take(difficulty) method returning a
+        (puzzle, solution) pair, optionally followed by the puzzle's ID, or None,
+        e.g. a PuzzlePool; generates inline when the source has nothing ready.
+        seed: generate the puzzle for this seed (0 <= seed < 2**SEED_BITS) instead
+        of a fresh one drawn from the game's RNG; the source is then skipped.
+        budget: bounds inline generation; if it runs out, SearchBudgetExceeded is
+        raised and the current game is left as it was.
+        """
+        ready = source.take(difficulty) if source is not None and seed is None else None
+        if ready is None:
+            if seed is None:
+                seed = self.rng.getrandbits(SEED_BITS)
+            solution, puzzle = self._generate(seed, difficulty, budget)
+            ready = puzzle, solution, (encode_puzzle_id(self.box_size, difficulty, seed)
+                                       if difficulty in PUZZLE_DIFFICULTIES else None)
+        self.load_puzzle(*ready)
+
+    def load_puzzle(self, puzzle, solution, puzzle_id: Optional[str] = None):
+        """Start an already generated puzzle, continuing the version numbering.
+
+        Lets a caller deal the puzzle first (say on a scratch game) and only then
+        lock the session it goes into.
+        """
+        self.board, self.solution = puzzle, solution
+        self.puzzle_id = puzzle_id
+        self.version += 1
+        self.started = self.version
+        self.changes = []
+
+    def new_game_from_id(self, puzzle_id: str) -> str:
+        """Start the exact puzzle (or puzzle variant) named by puzzle_id and return its difficulty.
+
+        Raises ValueError for a malformed ID or one for another board size.
+        """
+        box_size, difficulty, seed, transform = decode_puzzle_id(puzzle_id)
+        if box_size != self.box_size:
+            raise ValueError(f"puzzle {puzzle_id} is for box size {box_size}, not {self.box_size}")
+        self.new_game(difficulty, seed=seed)
+        if transform is not None:
+            variant = random_transform(box_size, random.Random(transform))
+            self.board = apply_transform(self.board, variant)
+            self.solution = apply_transform(self.solution, variant)
+            self.puzzle_id = puzzle_id
+        return difficulty
+
+    def _generate(self, seed: int, difficulty: str,
+                  budget: Optional[SearchBudget] = None) -> Tuple[FlatBoard, FlatBoard]:
+        """(solution, puzzle) generated from seed; recent results are cached, so replaying an ID is cheap"""
+        solution, puzzle = _generated_puzzle(type(self), self.box_size, difficulty, seed, budget)
+        return FlatBoard(self.size, solution), FlatBoard(self.size, puzzle)
     
     def make_move(self, row: int, col: int, num: int) -> bool:
         """Make a move on the board"""
-        if 0 <= row < 9 and 0 <= col < 9 and 1 <= num <= 9:
+        if 0 <= row < self.size and 0 <= col < self.size and 1 <= num <= self.size:
             if self.board[row][col] == 0 and self.is_valid_move(self.board, row, col, num):
-                self.board[row][col] = num
+                self.set_cell(row, col, num)
                 return True
         return False
+
+    def set_cell(self, row: int, col: int, num: int):
+        """Write num (0 clears) at (row, col) without validation, keeping the masks in sync"""
+        n = self.box_size
+        box = (row // n) * n + col // n
+        index = row * self.size + col
+        old = self.board.cells[index]
+        if old == num:
+            return
+        self.version += 1
+        self.changes.append(index)
+        if len(self.changes) > self.HISTORY:
+            del self.changes[0]
+        if old:
+            bit = ~(1 << old)
+            self.row_masks[row] &= bit
+            self.col_masks[col] &= bit
+            self.box_masks[box] &= bit
+        self._board.cells[index] = num
+        if num:
+            bit = 1 << num
+            self.row_masks[row] |= bit
+            self.col_masks[col] |= bit
+            self.box_masks[box] |= bit
+        if num and not old:
+            self._empty_count -= 1
+            if self._empty_cells is not None:
+                self._remove_empty((row, col))
+        elif old and not num:
+            self._empty_count += 1
+            if self._empty_cells is not None:
+                self._empty_index[(row, col)] = len(self._empty_cells)
+                self._empty_cells.append((row, col))
+
+    def _remove_empty(self, cell: Tuple[int, int]):
+        # Swap-remove: move the last empty cell into the vacated slot
+        pos = self._empty_index.pop(cell)
+        last = self._empty_cells.pop()
+        if last != cell:
+            self._empty_cells[pos] = last
+            self._empty_index[last] = pos
+
+    def changed_since(self, version: int) -> Optional[List[Tuple[int, int, int]]]:
+        """(row, col, number) for each cell changed after version, or None if the history
+        does not reach back that far (or spans a new puzzle) and the whole grid is needed"""
+        behind = self.version - version
+        if version < self.started or behind < 0 or behind > len(self.changes):
+            return None
+        cells = dict.fromkeys(self.changes[len(self.changes) - behind:])
+        size = self.size
+        return [(index // size, index % size, self.board.cells[index]) for index in cells]
+
+    def dump_state(self, givens: List[List[bool]]) -> str:
+        """Encode the board, solution, givens and version history for session storage"""
+        return encode_state(self.board, self.solution, givens, self.version, self.started, self.changes)
+
+    def load_state(self, text: str) -> List[List[bool]]:
+        """Restore a game saved with dump_state; returns its given-cell mask"""
+        state = decode_state(text)
+        if len(state.board) != self.size:
+            raise ValueError(f"state is for a {len(state.board)}x{len(state.board)} board, not {self.size}x{self.size}")
+        self.board, self.solution = state.board, state.solution
+        self.version, self.started, self.changes = state.version, state.started, list(state.changes)
+        return state.givens
+
+    def clear_cell(self, row: int, col: int):
+        """Clear the cell at (row, col)"""
+        self.set_cell(row, col, 0)
     
     def is_complete(self) -> bool:
         """Check if the puzzle is complete"""
-        for row in self.board:
-            if 0 in row:
-                return False
-        return True
+        return self.empty_count == 0
     
     def get_hint(self) -> Optional[Tuple[int, int, int]]:
         """Get a hint (row, col, number)"""
-        empty_cells = [(i, j) for i in range(9) for j in range(9) if self.board[i][j] == 0]
-        if empty_cells:
-            row, col = random.choice(empty_cells)
+        empties = self._empties()
+        if empties:
+            row, col = self.rng.choice(empties)
             return (row, col, self.solution[row][col])
         return None
     
+    def apply_hint(self) -> Optional[Tuple[int, int, int]]:
+        """Place a hint on the board and return it (row, col, number), or None if the board is full"""
+        hint = self.get_hint()
+        if hint:
+            self.set_cell(*hint)
+        return hint
+    
+    def check_move(self, row: int, col: int, num: int):
+        """Raise ValueError unless row and col name a cell and num is 0 (clear) to size.
+
+        Client input goes through this before reaching set_cell, which trusts its
+        arguments: a negative index would address another cell and a digit above
+        the board size would not fit the packed state.
+        """
+        for value in (row, col, num):
+            if type(value) is not int:
+                raise ValueError(f"move must be three integers: {(row, col, num)!r}")
+        if not (0 <= row < self.size and 0 <= col < self.size and 0 <= num <= self.size):
+            raise ValueError(f"move out of range: {(row, col, num)}")
+
+    def apply_moves(self, moves: Iterable[Tuple[int, int, int]]) -> List[bool]:
+        """Apply (row, col, num) moves in order, num 0 clearing the cell, and return which were valid.
+        
+        Invalid placements are skipped, as they are when sent one at a time. Nothing is
+        applied if any move is malformed or out of range (ValueError, see check_move).
+        """
+        moves = list(moves)
+        for row, col, num in moves:
+            self.check_move(row, col, num)
+        results = []
+        for row, col, num in moves:
+            if num == 0:
+                self.clear_cell(row, col)
+                results.append(True)
+            elif self.is_valid_move(self.board, row, col, num):
+                self.set_cell(row, col, num)
+                results.append(True)
+            else:
+                results.append(False)
+        return results
+    
     def print_board(self):
         """Print the current board"""
-        print("   " + " ".join([str(i) if i % 3 != 0 or i == 0 else "| " + str(i) for i in range(9)]))
-        print("  " + "_" * 23)
-        for i in range(9):
-            if i % 3 == 0 and i != 0:
-                print("  |" + "-" * 21 + "|")
-            row_str = str(i) + " |"
-            for j in range(9):
-                if j % 3 == 0 and j != 0:
+        n, size = self.box_size, self.size
+        width = len(str(size))  # characters per number
+        line = size * (width + 1) + (n - 1) * 2 + 1
+        pad = " " * (width + 1)
+        print(pad + " " + " ".join([str(i).rjust(width) if i % n != 0 or i == 0 else "| " + str(i).rjust(width)
+                                    for i in range(size)]))
+        print(pad + "_" * line)
+        for i in range(size):
+            if i % n == 0 and i != 0:
+                print(pad + "|" + "-" * (line - 2) + "|")
+            row_str = str(i).rjust(width) + " |"
+            for j in range(size):
+                if j % n == 0 and j != 0:
                     row_str += "| "
-                row_str += str(self.board[i][j] if self.board[i][j] != 0 else ".") + " "
+                row_str += str(self.board[i][j] if self.board[i][j] != 0 else ".").rjust(width) + " "
             row_str += "|"
             print(row_str)
-        print("  " + "_" * 23)
+        print(pad + "_" * line)
+
+
+# Recently generated (solution, puzzle) cell snapshots by (class, box size, difficulty, seed), least recent first
+_GENERATED: "OrderedDict[tuple, tuple]" = OrderedDict()
+_GENERATED_MAX = 256
+_generated_lock = threading.Lock()
+
+
+def _generated_puzzle(cls, box_size: int, difficulty: str, seed: int, budget: Optional[SearchBudget] = None):
+    # Node caps are fixed per cell and a budget can only abort generation, never change its outcome,
+    # so the result depends only on the key
+    key = (cls, box_size, difficulty, seed)
+    with _generated_lock:
+        cached = _GENERATED.get(key)
+        if cached is not None:
+            _GENERATED.move_to_end(key)
+            return cached
+    game = cls(box_size=box_size)
+    rng = random.Random(seed)
+    solution = game.generate_complete_board(rng, budget)
+    puzzle = game.remove_numbers(solution, difficulty, rng, budget)
+    result = as_flat(solution).snapshot(), as_flat(puzzle).snapshot()
+    with _generated_lock:
+        _GENERATED[key] = result
+        if len(_GENERATED) > _GENERATED_MAX:
+            _GENERATED.popitem(last=False)
+    return result
 
 
 def main():
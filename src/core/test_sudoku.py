@@ -1,6 +1,31 @@
 #!/usr/bin/env python3
 
+import asyncio
+import base64
+import json
+import os
+import pickle
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+
 from sudoku import SudokuGame
+from pool import PuzzlePool, VariantSource
+from bank import PuzzleBank, write_bank
+from batch import check_boards, np
+from logical import rate
+from session_store import MemorySessionStore, SQLiteSessionStore, make_store
+from tokens import BadToken, TokenSigner
+from metrics import profile, registry
+from solvers import MRVSolver, SearchBudget, SearchBudgetExceeded
+from parallel import ParallelSolver
+from transforms import apply_transform, random_transform
+from board import FlatBoard
+from codec import (board_to_string, decode_puzzle_id, decode_state, encode_puzzle_id, encode_state,
+                   givens_from_board, givens_to_string, pack_state, state_etag, string_to_board, string_to_givens)
 
 def test_sudoku():
     game = SudokuGame()
@@ -34,5 +59,874 @@ def test_sudoku():
     
     print("\nAll tests passed! The Sudoku game is working correctly.")
 
+def test_bitmask_validation():
+    game = SudokuGame()
+    game.new_game("hard")
+    
+    print("\nTesting bitmask move validation...")
+    
+    # Masks must agree with a full row/column/box scan on a detached copy
+    copy_board = [row[:] for row in game.board]
+    for i in range(9):
+        for j in range(9):
+            for num in range(1, 10):
+                assert game.is_valid_move(game.board, i, j, num) == game.is_valid_move(copy_board, i, j, num)
+    print("✓ Bitmask validation matches full scan")
+    
+    # Clearing and re-placing a cell keeps the masks in sync
+    row, col = next((i, j) for i in range(9) for j in range(9) if game.board[i][j] != 0)
+    num = game.board[row][col]
+    game.clear_cell(row, col)
+    assert game.is_valid_move(game.board, row, col, num)
+    game.set_cell(row, col, num)
+    assert not game.is_valid_move(game.board, row, col, num)
+    print("✓ Masks updated by clear_cell/set_cell")
+
+def test_solver_engines():
+    print("\nTesting solver engines...")
+    
+    game = SudokuGame()
+    game.new_game("hard")
+    
+    # Both engines must solve the same puzzle to a grid consistent with the givens
+    for engine in ("backtracking", "mrv"):
+        solver = SudokuGame(engine=engine)
+        board = [row[:] for row in game.board]
+        assert solver.solve_sudoku(board)
+        for i in range(9):
+            assert sorted(board[i]) == list(range(1, 10))
+            assert sorted(board[r][i] for r in range(9)) == list(range(1, 10))
+            for j in range(9):
+                assert game.board[i][j] in (0, board[i][j])
+        print(f"✓ {engine} engine solved the puzzle")
+    
+    # Conflicting givens are rejected rather than searched
+    board = [[0] * 9 for _ in range(9)]
+    board[0][0] = board[0][1] = 1
+    assert not SudokuGame(engine="mrv").solve_sudoku(board)
+    print("✓ mrv engine rejects conflicting givens")
+
+def test_unique_generation():
+    print("\nTesting unique puzzle generation...")
+    
+    game = SudokuGame()
+    for difficulty in ("easy", "medium", "hard"):
+        game.new_game(difficulty)
+        assert game.count_solutions(game.board, limit=10) == 1
+        assert all(game.board[i][j] in (0, game.solution[i][j]) for i in range(9) for j in range(9))
+        print(f"✓ {difficulty} puzzle has a unique solution")
+    
+    # Counting stops at the limit on an open board
+    empty = [[0] * 9 for _ in range(9)]
+    assert game.count_solutions(empty, limit=2) == 2
+    assert SudokuGame(engine="backtracking").count_solutions(empty, limit=3) == 3
+    print("✓ Solution counting exits early")
+
+def test_puzzle_pool():
+    print("\nTesting puzzle pool...")
+    
+    pool = PuzzlePool(difficulties=("easy",), size=2, low_water=0, start=False)
+    pool.fill()
+    assert pool.levels() == {"easy": 2}
+    
+    game = SudokuGame()
+    game.new_game("easy", source=pool)
+    assert game.count_solutions(game.board) == 1
+    print("✓ New game served from the pool")
+    
+    pool.take("easy")
+    assert pool.take("easy") is None
+    game.new_game("easy", source=pool)
+    assert any(0 in row for row in game.board)
+    print("✓ Empty pool falls back to inline generation")
+    
+    pool.start()
+    for _ in range(100):
+        if pool.levels()["easy"] == 2:
+            break
+        time.sleep(0.05)
+    pool.stop()
+    assert pool.levels()["easy"] == 2
+    print("✓ Background thread refills the pool")
+
+def test_codec():
+    print("\nTesting state codec...")
+    
+    game = SudokuGame()
+    game.new_game("medium")
+    givens = givens_from_board(game.board)
+    row, col = next((i, j) for i in range(9) for j in range(9) if game.board[i][j] == 0)
+    game.set_cell(row, col, game.solution[row][col])
+    
+    text = board_to_string(game.board)
+    assert len(text) == 81 and string_to_board(text) == game.board
+    assert string_to_board(text.replace("0", ".")) == game.board
+    assert string_to_givens(givens_to_string(givens)) == givens
+    print("✓ 81-char board and givens round-trip")
+    
+    state = encode_state(game.board, game.solution, givens, 7, 5, (3, 80))
+    assert decode_state(state) == (game.board, game.solution, givens, 7, 5, (3, 80))
+    print(f"✓ Packed state round-trips in {len(state)} chars")
+    
+    legacy = base64.urlsafe_b64encode(bytes([1]) + pack_state(game.board, game.solution, givens)[1:2] +
+                                      pack_state(game.board, game.solution, givens)[11:]).decode("ascii")
+    assert len(legacy) == 128 and decode_state(legacy) == (game.board, game.solution, givens, 0, 0, ())
+    print("✓ Version 1 states still decode")
+    
+    for bad in ("1234", "x" * 81):
+        try:
+            string_to_board(bad)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"{bad!r} should be rejected")
+    for bad, message in (("1" * 80, "expected 81 cells (or 16, 256 or 625), got 80"),
+                         ("2" * 81, "expected a '0'/'1' string")):
+        try:
+            string_to_givens(bad)
+        except ValueError as e:
+            assert str(e) == message, str(e)
+        else:
+            raise AssertionError(f"{bad!r} should be rejected")
+    assert len(string_to_givens("1" * 256)) == 16
+    print("✓ Malformed boards rejected")
+
+def test_puzzle_bank():
+    print("\nTesting puzzle bank...")
+    
+    game = SudokuGame()
+    puzzles = {"easy": [], "hard": []}
+    for difficulty, entries in puzzles.items():
+        for _ in range(3):
+            game.new_game(difficulty)
+            entries.append((game.board, game.solution))
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "puzzles.bank")
+        write_bank(path, puzzles)
+        with PuzzleBank(path) as bank:
+            assert bank.counts() == {"easy": 3, "hard": 3}
+            assert bank.get("hard", 2) == puzzles["hard"][2]
+            assert bank.take("medium") is None
+            game.new_game("easy", source=bank)
+            assert (game.board, game.solution) in puzzles["easy"]
+    print("✓ Bank round-trips puzzles and serves new games")
+
+def test_batch_validation():
+    print("\nTesting batch validation...")
+    
+    if np is None:
+        print("- NumPy not installed, skipping")
+        return
+    
+    game = SudokuGame()
+    game.new_game("easy")
+    solved = np.array(game.solution)
+    swapped = solved.copy()
+    swapped[0, [0, 1]] = swapped[0, [1, 0]]
+    report = check_boards([solved, swapped, game.board])
+    assert report.complete.tolist() == [True, True, False]
+    assert report.valid.tolist() == [True, False, True]
+    assert report.solved.tolist() == [True, False, False]
+    assert report.conflicts[1, 0, 0] and report.conflicts[1, 0, 1] and not report.conflicts[0].any()
+    print("✓ Batch report flags completeness, validity and conflicting cells")
+
+def test_logical_rating():
+    print("\nTesting logical solver and rating...")
+    
+    easy = string_to_board("003020600900305001001806400008102900700000008006708200002609500800203009005010300")
+    rating = rate(easy)
+    assert rating.solved and rating.level == "easy"
+    print(f"✓ Singles-only puzzle rated {rating.level}")
+    
+    escargot = string_to_board("1....7.9..3..2...8..96..5....53..9...1..8...26....4...3......1..4......7..7...3..")
+    rating = rate(escargot)
+    assert not rating.solved and rating.level == "expert"
+    print(f"✓ Guessing puzzle rated {rating.level}")
+    
+    # The logic engine falls back to search and agrees with mrv
+    board, reference = [row[:] for row in escargot], [row[:] for row in escargot]
+    assert SudokuGame(engine="logic").solve_sudoku(board)
+    assert SudokuGame(engine="mrv").solve_sudoku(reference)
+    assert board == reference
+    print("✓ logic engine solves with search fallback")
+
+def test_incremental_state():
+    print("\nTesting incremental game state...")
+    
+    game = SudokuGame()
+    game.new_game("medium")
+    empty = [(i, j) for i in range(9) for j in range(9) if game.board[i][j] == 0]
+    assert game.empty_count == len(empty)
+    
+    row, col = empty[0]
+    assert game.solution[row][col] in game.candidates(row, col)
+    for num in game.candidates(row, col):
+        assert game.is_valid_move(game.board, row, col, num)
+    print("✓ Candidates match move validation")
+    
+    for i, j in empty:
+        assert game.make_move(i, j, game.solution[i][j])
+        assert game.empty_count == len(empty) - empty.index((i, j)) - 1
+    assert game.is_complete() and game.get_hint() is None
+    game.clear_cell(row, col)
+    assert not game.is_complete() and game.get_hint() == (row, col, game.solution[row][col])
+    print("✓ Empty-cell count, completion and hints track moves and clears")
+
+    # A restored game counts its empty cells once and then tracks them without building the hint list
+    restored = SudokuGame()
+    restored.load_state(game.dump_state(givens_from_board(game.board)))
+    assert restored.empty_count == 1 and restored._empty_cells is None
+    restored.set_cell(row, col, game.solution[row][col])
+    restored.set_cell(0, 0, 0)
+    assert restored.empty_count == 1 == restored.board.cells.count(0) and restored._empty_cells is None
+    restored.set_cell(0, 0, game.solution[0][0])
+    assert restored.is_complete()
+    print("✓ Restored games keep the count incrementally")
+
+def test_batched_moves():
+    print("\nTesting batched moves and hints...")
+    
+    game = SudokuGame()
+    game.new_game("easy")
+    empty = [(i, j) for i in range(9) for j in range(9) if game.board[i][j] == 0]
+    r1, c1 = empty[0]
+    right = game.solution[r1][c1]
+    # A digit already given in the row of an empty cell can never be placed there
+    r2, c2 = next((i, j) for i, j in empty if any(game.board[i]))
+    wrong = next(num for num in game.board[r2] if num)
+    assert game.apply_moves([(r1, c1, right), (r2, c2, wrong), (r1, c1, 0)]) == [True, False, True]
+    assert game.board[r1][c1] == 0 and game.board[r2][c2] == 0
+    print("✓ Moves applied in order with per-move validity")
+    
+    before = [row[:] for row in game.board]
+    try:
+        game.apply_moves([(r1, c1, right), (9, 0, 1)])
+        assert False, "out-of-range move accepted"
+    except ValueError:
+        pass
+    assert game.board == before
+    print("✓ Out-of-range batch rejected without changes")
+
+    for move in [(-1, 0, 1), (0, 9, 1), (0, 0, 10), (0, 0, -1), ("0", 0, 1), (0, 1.0, 1), (0, 0, True)]:
+        try:
+            game.check_move(*move)
+            assert False, f"malformed move {move!r} accepted"
+        except ValueError:
+            pass
+    game.check_move(8, 8, 0)
+    game.check_move(0, 0, 9)
+    print("✓ Malformed or out-of-range single moves rejected")
+    
+    count = game.empty_count
+    row, col, num = game.apply_hint()
+    assert game.board[row][col] == num == game.solution[row][col]
+    assert game.empty_count == count - 1
+    print("✓ Hint placed in one step")
+
+def test_versioned_state():
+    print("\nTesting versioned game state...")
+    
+    game = SudokuGame()
+    game.new_game("easy")
+    start = game.version
+    empty = [(i, j) for i in range(9) for j in range(9) if game.board[i][j] == 0]
+    (r1, c1), (r2, c2) = empty[:2]
+    game.set_cell(r1, c1, game.solution[r1][c1])
+    game.set_cell(r1, c1, game.solution[r1][c1])  # no change, no new version
+    game.set_cell(r2, c2, game.solution[r2][c2])
+    assert game.version == start + 2
+    assert game.changed_since(start) == [(r1, c1, game.solution[r1][c1]), (r2, c2, game.solution[r2][c2])]
+    assert game.changed_since(start + 1) == [(r2, c2, game.solution[r2][c2])]
+    assert game.changed_since(game.version) == []
+    assert game.changed_since(start - 1) is None and game.changed_since(game.version + 1) is None
+    print("✓ Changes since a version, full grid when the history cannot say")
+    
+    givens = givens_from_board(game.board)
+    saved = game.dump_state(givens)
+    restored = SudokuGame()
+    assert restored.load_state(saved) == givens
+    assert restored.version == game.version and restored.changed_since(start + 1) == game.changed_since(start + 1)
+    for k in range(SudokuGame.HISTORY + 1):
+        restored.set_cell(r1, c1, k % 2 and game.solution[r1][c1])
+    assert restored.changed_since(game.version) is None and len(restored.changes) == SudokuGame.HISTORY
+    assert state_etag(saved) != state_etag(restored.dump_state(givens))
+    restored.new_game("easy")
+    assert restored.started == restored.version > game.version
+    dealt = SudokuGame()
+    dealt.new_game("hard")
+    before = restored.version
+    restored.load_puzzle(dealt.board, dealt.solution, dealt.puzzle_id)
+    assert restored.started == restored.version == before + 1 and restored.board == dealt.board
+    assert restored.puzzle_id == dealt.puzzle_id and restored.changes == []
+    print("✓ Versions survive save/load and keep increasing across new games")
+
+def test_session_store():
+    print("\nTesting session store...")
+    
+    now = [0.0]
+    store = MemorySessionStore(max_entries=2, ttl=10, clock=lambda: now[0])
+    store.set("a", "1")
+    store.set("b", "2")
+    assert store.get("a") == "1"
+    store.set("c", "3")  # evicts "b", the least recently used
+    assert store.get("b") is None and store.get("a") == "1" and store.get("c") == "3"
+    print("✓ Least recently used entry evicted")
+    
+    now[0] = 11.0
+    assert store.get("a") is None
+    stats = store.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["expirations"]) == (3, 2, 1, 1)
+    print("✓ Entries expire after their TTL and counters add up")
+    
+    sized = MemorySessionStore(max_bytes=10, ttl=None)
+    sized.set("k1", "xxxx")
+    sized.set("k2", "yyyy")
+    assert sized.get("k1") is None and sized.get("k2") == "yyyy"
+    print("✓ Byte cap enforced")
+    
+    # A slow update locks only its own key
+    locking = MemorySessionStore(ttl=None)
+    locking.set("k2", "yyyy")
+    entered, release = threading.Event(), threading.Event()
+    def slow(value):
+        entered.set()
+        release.wait(5)
+        return "slow"
+    worker = threading.Thread(target=locking.update, args=("k1", slow))
+    worker.start()
+    entered.wait(5)
+    assert locking.update("k2", lambda value: value + "!") == "yyyy!" and worker.is_alive()
+    release.set()
+    worker.join()
+    assert locking.get("k1") == "slow" and not locking._update_locks
+    print("✓ Updates lock per key")
+
+def test_shared_session_store():
+    print("\nTesting shared session store...")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sessions.db")
+        store = make_store(f"sqlite:///{path}", ttl=None)
+        assert isinstance(store, SQLiteSessionStore)
+        store.set("a", "1")
+        other = SQLiteSessionStore(path, ttl=None)  # a second worker's view of the same file
+        assert other.get("a") == "1"
+        print("✓ State written by one store is visible to another")
+        
+        for _ in range(5):
+            other.update("a", lambda value: str(int(value) + 1))
+        assert store.update("a", lambda value: None) is None and store.get("a") == "6"
+        store.delete("a")
+        assert other.get("a") is None
+        print("✓ Atomic updates and deletes")
+    
+    try:
+        make_store("redis://localhost")
+        assert False, "unknown store URL accepted"
+    except ValueError:
+        pass
+
+def test_box_sizes():
+    print("\nTesting other board sizes...")
+    
+    for box_size in (2, 4):
+        game = SudokuGame(box_size=box_size)
+        size = box_size * box_size
+        start = time.perf_counter()
+        game.new_game("hard")
+        elapsed = time.perf_counter() - start
+        assert len(game.board) == size and all(len(row) == size for row in game.board)
+        assert game.count_solutions(game.board) == 1
+        assert all(sorted(row) == list(range(1, size + 1)) for row in game.solution)
+        print(f"✓ {size}x{size} hard puzzle with a unique solution in {elapsed:.2f}s")
+        
+        row, col, num = game.get_hint()
+        assert num in game.candidates(row, col)
+        assert not game.make_move(row, col, size + 1)
+        assert game.make_move(row, col, num) and game.board[row][col] == num
+        
+        text = board_to_string(game.board)
+        assert len(text) == size * size and string_to_board(text) == game.board
+        givens = givens_from_board(game.solution)
+        restored = SudokuGame(box_size=box_size)
+        assert restored.load_state(game.dump_state(givens)) == givens
+        assert (restored.board, restored.version, restored.changes) == (game.board, game.version, game.changes)
+        print(f"✓ {size}x{size} moves, text and packed state round-trip")
+    
+    game = SudokuGame(box_size=4)
+    game.new_game("easy")
+    rating = rate(game.board)
+    assert rating.solved
+    game.print_board()
+    print("✓ 16x16 puzzles rate and print")
+
+def test_seeded_generation():
+    print("\nTesting seeded generation and puzzle IDs...")
+    
+    first, second = SudokuGame(seed=42), SudokuGame(seed=42)
+    for difficulty in ("easy", "hard"):
+        first.new_game(difficulty)
+        second.new_game(difficulty)
+        assert (first.board, first.solution, first.puzzle_id) == (second.board, second.solution, second.puzzle_id)
+    assert first.get_hint() == second.get_hint()
+    print("✓ Same seed, same puzzles and hints")
+    
+    puzzle_id = first.puzzle_id
+    assert len(puzzle_id) == 11 and decode_puzzle_id(puzzle_id)[:2] == (3, "hard")
+    replay = SudokuGame(engine="logic")
+    assert replay.new_game_from_id(puzzle_id) == "hard"
+    assert (replay.board, replay.solution, replay.puzzle_id) == (first.board, first.solution, puzzle_id)
+    print(f"✓ Puzzle {puzzle_id} rebuilt from its ID with another engine")
+    
+    pool = PuzzlePool(difficulties=("medium",), size=1, low_water=0, start=False)
+    pool.fill()
+    replay.new_game("medium", source=pool)
+    pooled = (replay.board, replay.solution)
+    replay.new_game_from_id(replay.puzzle_id)
+    assert (replay.board, replay.solution) == pooled
+    print("✓ Pooled puzzles carry their IDs")
+    
+    for bad in ("", "not-an-id!", encode_puzzle_id(4, "easy", 1)):
+        try:
+            replay.new_game_from_id(bad)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"{bad!r} should be rejected")
+    print("✓ Malformed and other-size IDs rejected")
+
+def test_signed_tokens():
+    print("\nTesting signed game tokens...")
+    
+    game = SudokuGame()
+    game.new_game("easy")
+    state = game.dump_state(givens_from_board(game.board))
+    signer = TokenSigner("secret")
+    token = signer.sign(state)
+    assert token.startswith(state + ".") and TokenSigner(b"secret").verify(token) == state
+    print(f"✓ Token round-trips ({len(token)} chars)")
+    
+    forged = signer.sign(state[:-4] + "AAAA").rsplit(".", 1)[1]
+    for bad in (state, token[:-1], state + "." + forged, TokenSigner("other").sign(state), "é.x", None):
+        try:
+            signer.verify(bad)
+        except BadToken:
+            pass
+        else:
+            raise AssertionError(f"{bad!r} should be rejected")
+    print("✓ Unsigned, altered and foreign tokens rejected")
+
+def test_instrumentation():
+    print("\nTesting instrumentation...")
+    
+    game = SudokuGame(seed=3)
+    assert not registry.enabled
+    with profile() as stats:
+        game.new_game("hard")
+        game.solve_sudoku([row[:] for row in game.board])
+        row, col = next((i, j) for i in range(9) for j in range(9) if game.board[i][j] == 0)
+        game.make_move(row, col, game.solution[row][col])
+    assert stats.counters["sudoku_search_nodes_total"] > 0
+    assert stats.counters["sudoku_search_backtracks_total"] <= stats.counters["sudoku_search_nodes_total"]
+    assert stats.counters["sudoku_user_move_checks_total"] == 1  # the move, not the searches
+    assert set(stats.timings) == {"generate_complete_board", "remove_numbers", "solve_sudoku"}
+    calls, seconds = stats.timings["remove_numbers"]
+    assert calls == 1 and seconds > 0
+    print(f"✓ Hard game: {stats.counters['sudoku_search_nodes_total']:g} search nodes, "
+          f"remove_numbers {seconds * 1000:.1f}ms")
+    
+    before = registry.snapshot()
+    game.new_game("easy")
+    assert not registry.enabled and registry.snapshot() == before
+    print("✓ Nothing recorded outside profile()")
+    
+    puzzle = string_to_board("4.....8.5.3..........7......2.....6.....8.4......1.......6.3.7.5..2.....1.4......")
+    for engine in (SudokuGame(engine="backtracking"), SudokuGame(engine=ParallelSolver(workers=1))):
+        with profile() as stats:
+            assert engine.solve_sudoku([row[:] for row in puzzle])
+        assert stats.counters["sudoku_search_backtracks_total"] > 0
+        assert stats.counters["sudoku_search_nodes_total"] > stats.counters["sudoku_search_backtracks_total"]
+    print("✓ Backtracking and parallel (in-process phase) searches counted")
+    
+    text = registry.render()
+    assert "# TYPE sudoku_search_nodes_total counter" in text
+    assert 'sudoku_operation_seconds_count{operation="remove_numbers"}' in text
+    assert 'sudoku_operation_seconds_bucket{operation="remove_numbers",le="+Inf"}' in text
+    print("✓ Prometheus text rendered")
+
+def test_search_budgets():
+    print("\nTesting search budgets...")
+    hard = string_to_board("4.....8.5.3..........7......2.....6.....8.4......1.......6.3.7.5..2.....1.4......")
+    
+    slow = SudokuGame(engine="backtracking")
+    for budget, reason in ((SearchBudget(max_nodes=100), "nodes"), (SearchBudget(timeout=0), "deadline")):
+        board = [row[:] for row in hard]
+        try:
+            slow.solve_sudoku(board, budget)
+            assert False, "budget was not enforced"
+        except SearchBudgetExceeded as e:
+            assert e.reason == reason
+        assert board == hard
+    cancel = threading.Event()
+    cancel.set()
+    try:
+        slow.count_solutions(hard, budget=SearchBudget(cancel=cancel))
+        assert False, "cancellation was ignored"
+    except SearchBudgetExceeded as e:
+        assert e.reason == "cancelled"
+    print("✓ Node caps, deadlines and cancellation stop the search and leave the board unchanged")
+    
+    game = SudokuGame()
+    budget = SearchBudget(max_nodes=100000, timeout=60)
+    board = [row[:] for row in hard]
+    assert game.solve_sudoku(board, budget) and 0 < budget.nodes <= 100000
+    assert game.has_unique_solution(hard, SearchBudget(max_nodes=100000))
+    print(f"✓ Solved within budget in {budget.nodes} nodes")
+    
+    game.new_game("easy", seed=1)
+    before = [row[:] for row in game.board], game.puzzle_id
+    try:
+        game.new_game("hard", seed=987654321, budget=SearchBudget(timeout=0))
+        assert False, "generation ignored its deadline"
+    except SearchBudgetExceeded as e:
+        assert e.reason == "deadline"
+    assert (game.board, game.puzzle_id) == before
+    budget = SearchBudget(timeout=60)
+    game.new_game("hard", seed=987654321, budget=budget)
+    assert budget.nodes > 0 and game.has_unique_solution(game.board)
+    replay = SudokuGame()
+    replay.new_game_from_id(game.puzzle_id)
+    assert replay.board == game.board
+    print("✓ Generation honours its deadline, and a budgeted puzzle replays from its ID")
+
+def test_parallel_search():
+    print("\nTesting parallel search...")
+    escargot = string_to_board("1....7.9..3..2...8..96..5....53..9...1..8...26....4...3......1..4......7..7...3..")
+    loose = string_to_board("......8.5.3..........7......2.....6.....8.4......1.......6.3.7.5..2.....1.4......")
+    
+    expected = [row[:] for row in escargot]
+    assert MRVSolver().solve(expected)
+    # A tiny split size forces the work through the pool
+    with ParallelSolver(workers=2, split_nodes=5) as engine:
+        board = [row[:] for row in escargot]
+        assert SudokuGame(engine=engine).solve_sudoku(board) and board == expected
+        assert engine._executor is not None
+        print("✓ Hard puzzle solved across worker processes")
+        
+        assert engine.count_solutions(escargot, 2) == 1
+        assert engine.count_solutions(loose, 200) == MRVSolver().count_solutions(loose, 200) == 200
+        print("✓ Parallel counts match the MRV engine")
+        
+        try:
+            engine.count_solutions(loose, 10 ** 6, SearchBudget(timeout=0.05))
+            assert False, "parallel search ignored its deadline"
+        except SearchBudgetExceeded as e:
+            assert e.reason == "deadline"
+        assert engine.count_solutions(escargot, 2) == 1
+        print("✓ A deadline stops every worker, and the pool is reusable afterwards")
+
+def test_symmetry_variants():
+    print("\nTesting symmetry variants...")
+    game = SudokuGame(seed=24)
+    game.new_game("hard")
+    puzzle, solution = game.board, game.solution
+    level = rate(puzzle).level
+    
+    for seed in range(20):
+        transform = random_transform(3, random.Random(seed))
+        varied, varied_solution = apply_transform(puzzle, transform), apply_transform(solution, transform)
+        assert game.count_solutions(varied_solution) == 1  # a filled board with a repeated digit counts 0
+        assert all(varied_solution[i][j] == num for i, row in enumerate(varied) for j, num in enumerate(row) if num)
+        assert sum(num == 0 for row in varied for num in row) == game.empty_count
+        assert game.count_solutions(varied) == 1 and rate(varied).level == level
+    assert random_transform(3, random.Random(7)) == random_transform(3, random.Random(7))
+    print(f"✓ Variants keep the solution unique and the rating ({level})")
+    
+    source = VariantSource(reuse=5, rng=random.Random(1))
+    dealt = set()
+    for _ in range(12):
+        game.new_game("medium", source=source)
+        dealt.add(board_to_string(game.board))
+        assert len(game.puzzle_id) == 16 and decode_puzzle_id(game.puzzle_id)[3] is not None
+    assert len(dealt) == 12
+    replay = SudokuGame()
+    assert replay.new_game_from_id(game.puzzle_id) == "medium"
+    assert (replay.board, replay.solution) == (game.board, game.solution)
+    print(f"✓ Variant {game.puzzle_id} rebuilt from its ID")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "one.bank")
+        write_bank(path, {"easy": [(puzzle, solution)]})
+        with PuzzleBank(path) as bank:
+            source = VariantSource(bank)
+            variants = [source.take("easy") for _ in range(5)]
+            assert source.take("hard") is None
+    assert len({board_to_string(p) for p, _, _ in variants}) == 5
+    assert all(variant_id is None for _, _, variant_id in variants)
+    print("✓ A one-puzzle bank deals distinct variants")
+
+def test_flat_board():
+    print("\nTesting flat board storage...")
+    rows = string_to_board("530070000600195000098000060800060003400803001700020006060000280000419005000080079")
+    board = FlatBoard.from_rows(rows)
+    assert board == rows and rows == board and len(board) == 9 and board[8][8] == 9
+    assert [row[:] for row in board] == rows and board.rows() == rows
+    saved, copied = board.snapshot(), board.copy()
+    board[0][2] = 4
+    assert rows[0][2] == 0 and copied[0][2] == 0 and board.cells[2] == 4 and board != copied
+    board.restore(saved)
+    assert board == copied and pickle.loads(pickle.dumps(board)) == board
+    print("✓ Row views, copies, snapshots and comparison with nested lists")
+    
+    fresh = SudokuGame()
+    assert fresh._board is None and fresh._solution is None  # nothing allocated until used or loaded
+    assert fresh.is_valid_move(fresh.board, 0, 0, 5) and fresh.empty_count == 81 and fresh.solution == [[0] * 9] * 9
+    
+    game = SudokuGame(seed=25)
+    game.new_game("hard")
+    restored = SudokuGame()
+    restored.load_state(game.dump_state(givens_from_board(game.board)))
+    assert restored.board == game.board and restored.candidates(0, 0) == game.candidates(0, 0)
+    assert isinstance(game.board, FlatBoard) and isinstance(game.solution, FlatBoard)
+    solution = game.solution.copy()
+    puzzle = game.remove_numbers(solution, "easy")
+    assert solution == game.solution and game.count_solutions(puzzle) == 1
+    assert decode_state(game.dump_state(givens_from_board(game.board))).board == game.board
+    
+    game.board = rows  # nested lists are copied in
+    rows[0][2] = 4
+    assert game.board[0][2] == 0 and game.make_move(0, 2, 4) and game.board.cells[2] == 4
+    assert game.solve_sudoku(game.board) and game.is_complete()
+    print("✓ Games, generation and the solver work on flat boards")
+
+def load_lambda_app():
+    """src/web/lambda_app, or None if Mangum (which it imports) is not installed"""
+    try:
+        import mangum  # noqa: F401
+    except ImportError:
+        return None
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+    from src.web import lambda_app
+    return lambda_app
+
+def asgi_request(app, method, path, query="", body=None, headers=()):
+    """Run one HTTP request through an ASGI app; returns (status, headers, body).
+    A dict or list body is sent as JSON, bytes as they are"""
+    headers = list(headers)
+    if isinstance(body, (dict, list)):
+        body = json.dumps(body).encode("utf-8")
+        headers.append(("Content-Type", "application/json"))
+    scope = {"type": "http", "method": method, "path": path, "query_string": query.encode("latin-1"),
+             "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]}
+    messages = [{"type": "http.request", "body": body or b"", "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start, end = sent
+    return (start["status"], {name.decode("latin-1"): value.decode("latin-1") for name, value in start["headers"]},
+            end["body"])
+
+def test_asgi_app():
+    print("\nTesting the ASGI Lambda app...")
+    
+    lambda_app = load_lambda_app()
+    if lambda_app is None:
+        print("- Mangum not installed, skipping")
+        return
+    app = lambda_app.app
+    
+    status, headers, body = asgi_request(app, "GET", "/", "session=asgi")
+    assert status == 200 and headers["content-type"] == "text/html; charset=utf-8"
+    assert headers["content-length"] == str(len(body)) and headers["cache-control"] == "no-cache"
+    game, givens = lambda_app.load_game(lambda_app.game_state.get("asgi"))
+    assert headers["etag"] == f'"{state_etag(lambda_app.game_state.get("asgi"))}"'
+    page = body.decode("utf-8")
+    cells = re.findall(r'class="cell box-(\d) ?(original)?"\s*id="cell-(\d)-(\d)".*?value="(\d?)"\s*maxlength="1"\s*'
+                       r'(readonly)?>', page, re.S)
+    assert len(cells) == 81
+    for box, original, i, j, value, readonly in cells:
+        i, j = int(i), int(j)
+        assert int(box) == (i // 3) * 3 + j // 3 and value == (str(game.board[i][j]) if game.board[i][j] else "")
+        assert bool(original) == bool(readonly) == givens[i][j]
+    assert f'data-version="{game.version}"' in page and "{{" not in page and "{%" not in page
+    print("✓ Board page rendered with every cell, its givens and the version")
+    
+    status, headers, body = asgi_request(app, "HEAD", "/", "session=asgi")
+    assert status == 200 and body == b"" and int(headers["content-length"]) > 0
+    status, headers, body = asgi_request(app, "GET", "/new_game/easy", "session=asgi")
+    result = json.loads(body)
+    assert status == 200 and headers["content-type"] == "application/json" and len(result["board"]) == 81
+    assert result["version"] == game.version + 1
+    print("✓ HEAD and JSON routes")
+    
+    for method, path, allow in (("POST", "/", "GET, HEAD, OPTIONS"), ("GET", "/make_move", "POST, OPTIONS"),
+                                ("DELETE", "/new_game/easy", "GET, HEAD, OPTIONS")):
+        status, headers, body = asgi_request(app, method, path)
+        assert status == 405 and headers["allow"] == allow and b"<h1>Method Not Allowed</h1>" in body
+    status, headers, _ = asgi_request(app, "OPTIONS", "/make_moves")
+    assert status == 200 and headers["allow"] == "POST, OPTIONS"
+    for path in ("/missing", "/new_game/", "/new_game/easy/extra"):
+        status, headers, body = asgi_request(app, "GET", path)
+        assert status == 404 and headers["content-type"] == "text/html; charset=utf-8" and b"Not Found" in body
+    status, _, body = asgi_request(app, "POST", "/make_move", body=b'{"row": 0}',
+                                   headers=[("Content-Type", "text/plain")])
+    assert status == 415 and b"Unsupported Media Type" in body
+    status, _, body = asgi_request(app, "POST", "/make_move", body=b"{not json",
+                                   headers=[("Content-Type", "application/json")])
+    assert status == 400 and b"Bad Request" in body
+    status, _, body = asgi_request(app, "POST", "/make_move", body={"row": -1, "col": 0, "num": 1})
+    assert status == 400 and json.loads(body) == {"error": "Invalid request data"}
+    print("✓ 404, 405, 415 and 400 responses")
+
+def test_http_batched_moves():
+    print("\nTesting batched moves over HTTP...")
+    
+    lambda_app = load_lambda_app()
+    if lambda_app is None:
+        print("- Mangum not installed, skipping")
+        return
+    app = lambda_app.app
+    
+    asgi_request(app, "GET", "/new_game/easy", "session=batch")
+    game, _ = lambda_app.load_game(lambda_app.game_state.get("batch"))
+    empty = [(i, j) for i in range(9) for j in range(9) if game.board[i][j] == 0]
+    (r1, c1), (r2, c2) = empty[:2]
+    right, other = game.solution[r1][c1], game.solution[r2][c2]
+    wrong = next(num for num in range(1, 10) if not game.is_valid_move(game.board, r2, c2, num))
+    moves = [{"row": r1, "col": c1, "num": right}, {"row": r2, "col": c2, "num": wrong},
+             {"row": r1, "col": c1, "num": 0}, {"row": r2, "col": c2, "num": other},
+             {"row": r1, "col": c1, "num": right}]
+    status, _, body = asgi_request(app, "POST", "/make_moves", body={"session": "batch", "moves": moves})
+    result = json.loads(body)
+    assert status == 200 and result["valid"] == [True, False, True, True, True]
+    assert result["version"] == game.version + 4 and not result["complete"]
+    saved, _ = lambda_app.load_game(lambda_app.game_state.get("batch"))
+    assert saved.board[r1][c1] == right and saved.board[r2][c2] == other
+    print("✓ Batch applied in order with per-move validity")
+    
+    before = lambda_app.game_state.get("batch")
+    for bad in ([{"row": r1, "col": c1, "num": 0}, {"row": 9, "col": 0, "num": 1}], [{"row": 0}], "moves"):
+        status, _, body = asgi_request(app, "POST", "/make_moves", body={"session": "batch", "moves": bad})
+        assert status == 400 and json.loads(body) == {"error": "Invalid request data"}
+    assert lambda_app.game_state.get("batch") == before
+    print("✓ Malformed batch rejected without changes")
+    
+    status, _, body = asgi_request(app, "POST", "/apply_hint", body={"session": "batch"})
+    result = json.loads(body)
+    hint = result["hint"]
+    saved, _ = lambda_app.load_game(lambda_app.game_state.get("batch"))
+    assert status == 200 and saved.board[hint["row"]][hint["col"]] == hint["num"] == game.solution[hint["row"]][hint["col"]]
+    assert result["version"] == saved.version and saved.empty_count == len(empty) - 3
+    print("✓ Hint picked and placed in one request")
+
+def test_http_conditional_state():
+    print("\nTesting ETags and conditional requests over HTTP...")
+    
+    lambda_app = load_lambda_app()
+    if lambda_app is None:
+        print("- Mangum not installed, skipping")
+        return
+    app = lambda_app.app
+    
+    asgi_request(app, "GET", "/new_game/medium", "session=etag")
+    status, headers, body = asgi_request(app, "GET", "/state", "session=etag")
+    etag = headers["etag"]
+    result = json.loads(body)
+    assert status == 200 and etag == f'"{state_etag(lambda_app.game_state.get("etag"))}"'
+    assert headers["cache-control"] == "no-cache" and len(result["board"]) == 81
+    for path in ("/state", "/"):
+        for sent in (etag, f"W/{etag}", f'"stale", {etag}', "*"):
+            status, headers, body = asgi_request(app, "GET", path, "session=etag", headers=[("If-None-Match", sent)])
+            assert status == 304 and body == b"" and headers["etag"] == etag and "content-length" not in headers
+    print("✓ Matching If-None-Match answered 304 with the ETag and no body")
+    
+    game, _ = lambda_app.load_game(lambda_app.game_state.get("etag"))
+    row, col = next((i, j) for i in range(9) for j in range(9) if game.board[i][j] == 0)
+    asgi_request(app, "POST", "/make_move", body={"session": "etag", "row": row, "col": col,
+                                                   "num": game.solution[row][col]})
+    status, headers, body = asgi_request(app, "GET", "/state", f"session=etag&since={result['version']}",
+                                         headers=[("If-None-Match", etag)])
+    assert status == 200 and headers["etag"] != etag
+    assert json.loads(body) == {"version": result["version"] + 1, "changes": [[row, col, game.solution[row][col]]]}
+    status, _, body = asgi_request(app, "GET", "/state", "session=etag&since=0")
+    assert status == 200 and "board" in json.loads(body)
+    print("✓ A change gives a new ETag, and ?since= returns only the changed cells")
+
+def test_http_tokens():
+    print("\nTesting stateless token mode over HTTP...")
+    
+    lambda_app = load_lambda_app()
+    if lambda_app is None:
+        print("- Mangum not installed, skipping")
+        return
+    app = lambda_app.app
+    stored = lambda_app.game_state.stats()["entries"]
+    # The app's own TokenSigner: its BadToken is the class the app catches
+    lambda_app.stateless, lambda_app.signer = True, lambda_app.TokenSigner("test key")
+    try:
+        status, _, body = asgi_request(app, "GET", "/new_game/easy")
+        dealt = json.loads(body)
+        token = dealt["token"]
+        game, _ = lambda_app.load_game(lambda_app.signer.verify(token))
+        assert status == 200 and board_to_string(game.board) == dealt["board"]
+        
+        row, col = next((i, j) for i in range(9) for j in range(9) if game.board[i][j] == 0)
+        num = game.solution[row][col]
+        status, _, body = asgi_request(app, "POST", "/make_move", body={"token": token, "row": row, "col": col, "num": num})
+        moved = json.loads(body)
+        assert status == 200 and moved["valid"] and moved["token"] != token and moved["version"] == dealt["version"] + 1
+        status, _, body = asgi_request(app, "GET", "/state", f"token={moved['token']}&since={dealt['version']}")
+        assert status == 200 and json.loads(body)["changes"] == [[row, col, num]]
+        # The server kept nothing: the old token still holds the game as it was
+        status, _, body = asgi_request(app, "GET", "/state", f"token={token}")
+        assert json.loads(body)["board"] == dealt["board"]
+        status, _, body = asgi_request(app, "GET", "/", f"token={moved['token']}")
+        assert status == 200 and f'data-token="{moved["token"]}"'.encode() in body
+        assert lambda_app.game_state.stats()["entries"] == stored
+        print("✓ Signed token round-trips through moves, state and the page")
+        
+        payload, signature = moved["token"].rsplit(".", 1)
+        other = lambda_app.TokenSigner("other key").sign(payload)
+        for bad in (payload + "." + signature[::-1], payload[:-4] + "AAAA." + signature, other, "garbage"):
+            status, _, body = asgi_request(app, "POST", "/make_move", body={"token": bad, "row": row, "col": col, "num": 0})
+            assert status == 400 and b"Bad Request" in body
+            status, _, _ = asgi_request(app, "GET", "/state", f"token={bad}")
+            assert status == 400
+        print("✓ Tampered or foreign tokens rejected with a 400")
+    finally:
+        lambda_app.stateless, lambda_app.signer = False, None
+
 if __name__ == "__main__":
-    test_sudoku()
\ No newline at end of file
+    test_sudoku()
+    test_bitmask_validation()
+    test_solver_engines()
+    test_unique_generation()
+    test_puzzle_pool()
+    test_codec()
+    test_puzzle_bank()
+    test_batch_validation()
+    test_logical_rating()
+    test_incremental_state()
+    test_batched_moves()
+    test_versioned_state()
+    test_session_store()
+    test_shared_session_store()
+    test_box_sizes()
+    test_seeded_generation()
+    test_signed_tokens()
+    test_instrumentation()
+    test_search_budgets()
+    test_parallel_search()
+    test_symmetry_variants()
+    test_flat_board()
+    test_asgi_app()
+    test_http_batched_moves()
+    test_http_conditional_state()
+    test_http_tokens()
@@ -0,0 +1,55 @@
+"""
+Signed tokens for client-held game state.
+
+A token is an encoded game state (see core.codec) followed by '.' and a
+truncated HMAC-SHA256 of it under the server's secret key. Any server that
+holds the key can trust a state the client sends back, so no copy has to be
+kept server-side.
+
+Tokens are signed, not encrypted: the state is plain base64 and includes
+the solution, so a client can decode it and read the answer. That is
+accepted on purpose. Every dealt puzzle has exactly one solution, so the
+givens the client is shown already determine it (any solver finds it in
+milliseconds), and /get_hint hands out solution digits anyway. The
+signature only stops a client from changing the game. Sign nothing a
+player must not see.
+"""
+
+import base64
+import hashlib
+import hmac
+from typing import Union
+
+
+class BadToken(ValueError):
+    """The token is malformed or its signature does not match"""
+
+
+class TokenSigner:
+    """Signs payloads with HMAC-SHA256 and verifies the tokens it produced"""
+
+    DIGEST_BYTES = 16  # 128-bit tags: 22 extra characters per token
+
+    def __init__(self, secret_key: Union[str, bytes]):
+        if not secret_key:
+            raise ValueError("a secret key is required to sign tokens")
+        self.key = secret_key.encode("utf-8") if isinstance(secret_key, str) else secret_key
+
+    def _signature(self, payload: bytes) -> bytes:
+        digest = hmac.new(self.key, payload, hashlib.sha256).digest()[:self.DIGEST_BYTES]
+        return base64.urlsafe_b64encode(digest).rstrip(b"=")
+
+    def sign(self, payload: str) -> str:
+        """Token for an ASCII payload (such as an encoded game state)"""
+        data = payload.encode("ascii")
+        return (data + b"." + self._signature(data)).decode("ascii")
+
+    def verify(self, token: str) -> str:
+        """Payload of a token made by sign(); raises BadToken if it was not, or was altered"""
+        try:
+            payload, sep, signature = token.encode("ascii").rpartition(b".")
+        except (AttributeError, UnicodeEncodeError):
+            raise BadToken("malformed token") from None
+        if not sep or not hmac.compare_digest(signature, self._signature(payload)):
+            raise BadToken("token signature does not match")
+        return payload.decode("ascii")
@@ -0,0 +1,72 @@
+"""
+Validity-preserving board transforms.
+
+Relabelling the digits, permuting the rows within each band and the bands
+themselves, doing the same for columns and stacks, and transposing all map
+a valid grid to a valid grid. Applied to a puzzle and its solution together
+they keep the solution unique and the puzzle exactly as hard: every logical
+technique reads the same after the transform. One generated 9x9 puzzle thus
+stands for 9! * 6^8 * 2, about 1.2e12, variants, each costing a copy of the
+board instead of a search.
+"""
+
+import random
+from typing import List, NamedTuple, Optional, Tuple, Union
+
+try:
+    from .board import FlatBoard
+except ImportError:
+    from board import FlatBoard
+
+
+class Transform(NamedTuple):
+    rows: Tuple[int, ...]     # row r of the result is row rows[r] of the input
+    cols: Tuple[int, ...]     # column c of the result is column cols[c] of the input
+    transpose: bool           # transpose after permuting
+    digits: Tuple[int, ...]   # digit d becomes digits[d]; digits[0] is 0, empty stays empty
+
+
+def random_transform(box_size: int = 3, rng: Optional[random.Random] = None) -> Transform:
+    """A uniformly random transform for N²×N² boards.
+
+    The draws are made in a fixed order, so the same RNG state always gives
+    the same transform; variant puzzle IDs rely on that.
+    """
+    rng = rng or random
+    n = box_size
+
+    def lines() -> Tuple[int, ...]:
+        bands = list(range(n))
+        rng.shuffle(bands)
+        order = []
+        for band in bands:
+            within = list(range(n))
+            rng.shuffle(within)
+            order.extend(band * n + k for k in within)
+        return tuple(order)
+
+    rows = lines()
+    cols = lines()
+    transpose = rng.random() < 0.5
+    digits = list(range(1, n * n + 1))
+    rng.shuffle(digits)
+    return Transform(rows, cols, transpose, (0,) + tuple(digits))
+
+
+def apply_transform(board: Union[List[List[int]], FlatBoard],
+                    transform: Transform) -> Union[List[List[int]], FlatBoard]:
+    """The transformed copy of board (a puzzle or a solution; 0 = empty), of the same type"""
+    digits = transform.digits
+    if isinstance(board, FlatBoard):
+        size = board.size
+        rows, cols = transform.rows, transform.cols
+        if transform.transpose:
+            order = [rows[c] * size + cols[r] for r in range(size) for c in range(size)]
+        else:
+            order = [rows[r] * size + cols[c] for r in range(size) for c in range(size)]
+        relabelled = board.cells.translate(bytes(digits).ljust(256, b"\0"))
+        return FlatBoard(size, bytes(map(relabelled.__getitem__, order)))
+    result = [[digits[board[r][c]] for c in transform.cols] for r in transform.rows]
+    if transform.transpose:
+        result = [list(column) for column in zip(*result)]
+    return result
@@ -10,11 +10,16 @@ import webbrowser
 import threading
 import time
 import socket
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, make_response
 
 # Add the parent src directory to path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 from core.sudoku import SudokuGame
+from core.solvers import SearchBudget, SearchBudgetExceeded
+from core.pool import PuzzlePool
+from core.session_store import make_store
+from core.codec import board_to_string, givens_from_board, givens_to_string, state_etag
+from core.metrics import instrument_flask
 
 # Add the current directory to the path for template resolution
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -23,49 +28,132 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 template_dir = os.path.join(os.path.dirname(__file__), '..', 'web', 'templates')
 app = Flask(__name__, template_folder=template_dir)
 app.secret_key = 'sudoku_desktop_app_secret_key'
+# Per-route latency, plus solver and generator counters at /metrics (recorded when SUDOKU_METRICS=1)
+instrument_flask(app)
 
-# Global game state
-game_state = {}
+# Global game state (SUDOKU_STORE=sqlite:///<path> shares it between worker processes)
+game_state = make_store(os.environ.get('SUDOKU_STORE', 'memory'), max_entries=1000, ttl=None)
 
-def get_or_create_game(session_id="default"):
-    if session_id not in game_state:
-        game = SudokuGame()
-        game.new_game('medium')
-        game_state[session_id] = {
-            'board': game.board,
-            'solution': game.solution,
-            'original_cells': [[game.board[i][j] != 0 for j in range(9)] for i in range(9)]
-        }
-    
+# Pre-generated puzzles, refilled in the background
+puzzle_pool = PuzzlePool()
+# Seconds inline generation may take when the pool has nothing ready
+GENERATE_TIMEOUT = 5
+
+def save_game(session_id, game, original_cells):
+    game_state.set(session_id, game.dump_state(original_cells))
+
+def deal_default():
+    """The state of a new medium game, for a session that has none"""
     game = SudokuGame()
-    game.board = game_state[session_id]['board']
-    game.solution = game_state[session_id]['solution']
-    return game
+    game.new_game('medium', source=puzzle_pool, budget=SearchBudget(timeout=GENERATE_TIMEOUT))
+    return game.dump_state(givens_from_board(game.board))
+
+def load_game(state):
+    """Decode a stored state into (game, original_cells)"""
+    game = SudokuGame()
+    original_cells = game.load_state(state)
+    return game, original_cells
+
+def get_state(session_id="default"):
+    """Return the session's stored state, starting a medium game if there is none"""
+    state = game_state.get(session_id)
+    if state is None:
+        state = deal_default()
+        game_state.set(session_id, state)
+    return state
+
+def update_game(session_id, change):
+    """Run change(game) on the session's game in one atomic store update, saving the game if it
+    returns True. A session with no game gets a medium one dealt before the update, since inline
+    generation must not hold the store's lock (on SQLite, a database-wide write lock)"""
+    fresh = None
+    while True:
+        if fresh is None and game_state.get(session_id) is None:
+            fresh = deal_default()
+        expired = []
+
+        def apply(state):
+            if state is None:
+                if fresh is None:
+                    expired.append(True)  # dropped since it was read: deal outside the lock and retry
+                    return None
+                state = fresh
+            game, original_cells = load_game(state)
+            if change(game) or state is fresh:
+                return game.dump_state(original_cells)
+            return None
+
+        game_state.update(session_id, apply)
+        if not expired:
+            return
+
+def get_or_create_game(session_id="default"):
+    """Return (game, original_cells) for the session, starting a medium game if needed"""
+    return load_game(get_state(session_id))
+
+@app.errorhandler(SearchBudgetExceeded)
+def generation_timed_out(error):
+    """Any route that had to deal a game inline and ran out of time"""
+    return jsonify({'error': 'Puzzle generation took too long, please try again'}), 503
+
+def conditional(response, etag):
+    """Tag a response so browsers revalidate it with If-None-Match on every load"""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/')
 def index():
     session_id = request.args.get('session', 'default')
-    game = get_or_create_game(session_id)
-    return render_template('sudoku.html', 
-                         board=game.board, 
-                         original_cells=game_state[session_id]['original_cells'])
+    state = get_state(session_id)
+    etag = state_etag(state)
+    if request.if_none_match.contains_weak(etag):
+        return conditional(app.response_class(status=304), etag)
+    game, original_cells = load_game(state)
+    return conditional(make_response(render_template('sudoku.html', 
+                                                     board=game.board, 
+                                                     original_cells=original_cells,
+                                                     version=game.version)), etag)
 
 @app.route('/new_game/<difficulty>')
 def new_game(difficulty):
     session_id = request.args.get('session', 'default')
-    game = SudokuGame()
-    game.new_game(difficulty)
+    result = {}
+    # Deal before taking the session's lock: inline generation can take a while
+    dealt = SudokuGame()
+    dealt.new_game(difficulty, source=puzzle_pool, budget=SearchBudget(timeout=GENERATE_TIMEOUT))
     
-    game_state[session_id] = {
-        'board': game.board,
-        'solution': game.solution,
-        'original_cells': [[game.board[i][j] != 0 for j in range(9)] for i in range(9)]
-    }
+    def deal(state):
+        # Continue the session's version numbering so clients never see a version reused
+        game = SudokuGame()
+        if state is not None:
+            game.load_state(state)
+        game.load_puzzle(dealt.board, dealt.solution, dealt.puzzle_id)
+        original_cells = givens_from_board(game.board)
+        result.update(board=board_to_string(game.board), original_cells=givens_to_string(original_cells),
+                      version=game.version)
+        return game.dump_state(original_cells)
     
-    return jsonify({
-        'board': game.board,
-        'original_cells': game_state[session_id]['original_cells']
-    })
+    game_state.update(session_id, deal)
+    return jsonify(result)
+
+@app.route('/state')
+def get_changes():
+    """Current grid, or only the cells changed since ?since=<version> when the history allows"""
+    session_id = request.args.get('session', 'default')
+    state = get_state(session_id)
+    etag = state_etag(state)
+    if request.if_none_match.contains_weak(etag):
+        return conditional(app.response_class(status=304), etag)
+    game, original_cells = load_game(state)
+    since = request.args.get('since', '')
+    changes = game.changed_since(int(since)) if since.isdigit() else None
+    if changes is None:
+        result = {'version': game.version, 'board': board_to_string(game.board),
+                  'original_cells': givens_to_string(original_cells)}
+    else:
+        result = {'version': game.version, 'changes': [list(change) for change in changes]}
+    return conditional(jsonify(result), etag)
 
 @app.route('/make_move', methods=['POST'])
 def make_move():
@@ -73,28 +161,79 @@ def make_move():
     if data is None:
         return jsonify({'error': 'No JSON data received'}), 400
 
-    row, col, num = data['row'], data['col'], data['num']
+    try:
+        row, col, num = data['row'], data['col'], data['num']
+        SudokuGame().check_move(row, col, num)
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Invalid request data'}), 400
     session_id = data.get('session', 'default')
     
-    game = get_or_create_game(session_id)
+    result = {'valid': False, 'complete': False}
     
-    if num == 0:
-        game.board[row][col] = 0
-        game_state[session_id]['board'] = game.board
-        return jsonify({'valid': True, 'complete': False})
+    def apply_move(game):
+        # Runs inside one atomic store update, so concurrent workers cannot lose a move
+        if num == 0:
+            game.clear_cell(row, col)
+            result['valid'] = True
+        elif game.is_valid_move(game.board, row, col, num):
+            game.set_cell(row, col, num)
+            result['valid'] = True
+            result['complete'] = game.is_complete()
+        result['version'] = game.version
+        return result['valid']
     
-    if game.is_valid_move(game.board, row, col, num):
-        game.board[row][col] = num
-        game_state[session_id]['board'] = game.board
-        is_complete = game.is_complete()
-        return jsonify({'valid': True, 'complete': is_complete})
-    else:
-        return jsonify({'valid': False, 'complete': False})
+    update_game(session_id, apply_move)
+    return jsonify(result)
+
+@app.route('/make_moves', methods=['POST'])
+def make_moves():
+    """Apply an ordered batch of moves (num 0 clears) in one store update"""
+    data = request.json
+    if data is None:
+        return jsonify({'error': 'No JSON data received'}), 400
+    try:
+        moves = [(move['row'], move['col'], move['num']) for move in data['moves']]
+        checker = SudokuGame()
+        for move in moves:
+            checker.check_move(*move)
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Invalid request data'}), 400
+    session_id = data.get('session', 'default')
+    
+    result = {'valid': [], 'complete': False}
+    
+    def apply_moves(game):
+        result['valid'] = game.apply_moves(moves)
+        result['complete'] = game.is_complete()
+        result['version'] = game.version
+        return any(result['valid'])
+    
+    update_game(session_id, apply_moves)
+    return jsonify(result)
+
+@app.route('/apply_hint', methods=['POST'])
+def apply_hint():
+    """Pick a hint and place it in one round-trip"""
+    data = request.get_json(silent=True)
+    session_id = data.get('session', 'default') if isinstance(data, dict) else 'default'
+    
+    result = {'hint': None, 'complete': False}
+    
+    def place_hint(game):
+        hint = game.apply_hint()
+        result['complete'] = game.is_complete()
+        result['version'] = game.version
+        if hint:
+            result['hint'] = {'row': hint[0], 'col': hint[1], 'num': hint[2]}
+        return hint is not None
+    
+    update_game(session_id, place_hint)
+    return jsonify(result)
 
 @app.route('/get_hint')
 def get_hint():
     session_id = request.args.get('session', 'default')
-    game = get_or_create_game(session_id)
+    game, _ = get_or_create_game(session_id)
     hint = game.get_hint()
     if hint:
         return jsonify({'hint': {'row': hint[0], 'col': hint[1], 'num': hint[2]}})
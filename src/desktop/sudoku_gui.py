@@ -103,12 +103,12 @@ class SudokuGUI:
         value = self.cells[row][col]['var'].get()
         
         if value == '':
-            self.game.board[row][col] = 0
+            self.game.clear_cell(row, col)
             self.cells[row][col]['entry'].configure(bg='white')
         elif value.isdigit() and '1' <= value <= '9':
             num = int(value)
             if self.game.is_valid_move(self.game.board, row, col, num):
-                self.game.board[row][col] = num
+                self.game.set_cell(row, col, num)
                 self.cells[row][col]['entry'].configure(bg='lightgreen')
                 
                 # Check if game is complete
@@ -117,7 +117,7 @@ class SudokuGUI:
                                       "You solved the puzzle!\nWell done!")
             else:
                 self.cells[row][col]['entry'].configure(bg='lightcoral')
-                self.game.board[row][col] = 0
+                self.game.clear_cell(row, col)
         else:
             self.cells[row][col]['var'].set('')
     
@@ -149,7 +149,7 @@ class SudokuGUI:
         if self.game.is_complete():
             messagebox.showinfo("Solution Check", "Congratulations! Puzzle solved correctly!")
         else:
-            empty_count = sum(row.count(0) for row in self.game.board)
+            empty_count = self.game.empty_count
             messagebox.showinfo("Solution Check", 
                               f"Puzzle not complete yet.\n{empty_count} cells remaining.")
 
@@ -4,6 +4,7 @@ from aws_cdk import (
     Stack,
     aws_lambda as _lambda,
     aws_apigateway as apigateway,
+    aws_secretsmanager as secretsmanager,
     Duration,
 )
 from constructs import Construct
@@ -12,6 +13,14 @@ class SudokuStack(Stack):
     def __init__(self, scope: Construct, construct_id: str, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
+        # HMAC key for the game tokens clients hold: generated at deploy time, never in source
+        token_key = secretsmanager.Secret(
+            self, "TokenSigningKey",
+            description="Key signing Sudoku game tokens",
+            generate_secret_string=secretsmanager.SecretStringGenerator(password_length=64,
+                                                                        exclude_punctuation=True),
+        )
+
         # Lambda function
         sudoku_lambda = _lambda.Function(
             self, "SudokuLambda",
@@ -21,10 +30,12 @@ class SudokuStack(Stack):
             timeout=Duration.seconds(30),
             memory_size=512,
             environment={
-                'SECRET_KEY': 'sudoku_lambda_secret_key_456'
+                'SECRET_KEY_ARN': token_key.secret_arn
             }
         )
 
+        token_key.grant_read(sudoku_lambda)
+
         # API Gateway
         api = apigateway.LambdaRestApi(
             self, "SudokuApi",
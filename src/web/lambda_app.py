@@ -1,97 +1,547 @@
-from mangum import Mangum
-from flask import Flask, render_template, request, jsonify
-from a2wsgi import WSGIMiddleware
+"""
+AWS Lambda entry point.
+
+A plain ASGI application run directly under Mangum: no Flask, Werkzeug,
+Jinja or WSGI bridge is imported, so cold starts are cheaper and each event
+goes through a single protocol translation. Responses (bodies, status codes
+and headers) match the Flask app this replaced, including its error pages.
+"""
+
 import json
+import logging
 import os
 import sys
+import time
+from urllib.parse import parse_qsl
+
+from mangum import Mangum
 
 # Add current directory to path for imports
 sys.path.insert(0, os.path.dirname(__file__))
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 from src.core.sudoku import SudokuGame
+from src.core.solvers import SearchBudget, SearchBudgetExceeded
+from src.core.pool import PuzzlePool, VariantSource
+from src.core.session_store import make_store
+from src.core.bank import PuzzleBank
+from src.core.codec import board_to_string, givens_from_board, givens_to_string, state_etag
+from src.core.tokens import BadToken, TokenSigner
+from src.core.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, registry as metrics
 
-# Set template folder relative to current file
-template_dir = os.path.join(os.path.dirname(__file__), 'templates')
-app = Flask(__name__, template_folder=template_dir)
-app.secret_key = os.environ.get('SECRET_KEY', 'sudoku_game_secret_key_123')
+logger = logging.getLogger(__name__)
 
-# Simple in-memory storage for Lambda (since sessions don't work well)
-game_state = {}
+template_path = os.path.join(os.path.dirname(__file__), 'templates', 'sudoku.html')
 
-def get_or_create_game(session_id="default"):
-    if session_id not in game_state:
-        game = SudokuGame()
-        game.new_game('medium')
-        game_state[session_id] = {
-            'board': game.board,
-            'solution': game.solution,
-            'original_cells': [[game.board[i][j] != 0 for j in range(9)] for i in range(9)]
-        }
-    
+# Game state store (sessions don't work well on Lambda). The default in-memory store is
+# bounded so a warm container does not grow with every distinct session id; set
+# SUDOKU_STORE=sqlite:///<path> to share state between worker processes on one host
+game_state = make_store(os.environ.get('SUDOKU_STORE', 'memory'),
+                        max_entries=int(os.environ.get('SUDOKU_SESSION_MAX_ENTRIES', 10000)),
+                        max_bytes=int(os.environ.get('SUDOKU_SESSION_MAX_BYTES', 16 * 1024 * 1024)),
+                        ttl=float(os.environ.get('SUDOKU_SESSION_TTL', 3600)))
+
+
+def load_secret_key():
+    """SECRET_KEY, or else the Secrets Manager secret named by SECRET_KEY_ARN ('' if neither is set)"""
+    key = os.environ.get('SECRET_KEY', '')
+    arn = os.environ.get('SECRET_KEY_ARN')
+    if not key and arn:
+        import boto3  # part of the Lambda runtime; only needed for this one read per cold start
+        key = boto3.client('secretsmanager').get_secret_value(SecretId=arn)['SecretString']
+    return key
+
+
+# Stateless mode (SUDOKU_STATELESS=1): nothing is kept per player. Every response carries the
+# game as a token signed with the secret key and the client sends it back with its next request,
+# so any instance can serve any player. Whoever knows the key can forge any game, so there is no
+# default: without one the handler refuses to start
+stateless = os.environ.get('SUDOKU_STATELESS', '') not in ('', '0')
+signer = None
+if stateless:
+    secret_key = load_secret_key()
+    if not secret_key:
+        raise RuntimeError('SUDOKU_STATELESS=1 needs SECRET_KEY or SECRET_KEY_ARN to sign game tokens')
+    signer = TokenSigner(secret_key)
+
+# Puzzle source: the memory-mapped bank shipped with the package when present
+# (an O(1) random read shared through the page cache), otherwise pre-generated
+# puzzles refilled in the background while the container is warm
+bank_path = os.environ.get('SUDOKU_BANK_PATH', os.path.join(os.path.dirname(__file__), 'puzzles.bank'))
+if os.path.exists(bank_path):
+    puzzle_source = PuzzleBank(bank_path)
+else:
+    puzzle_source = PuzzlePool(size=int(os.environ.get('SUDOKU_POOL_SIZE', 10)),
+                             low_water=int(os.environ.get('SUDOKU_POOL_LOW_WATER', 3)))
+# SUDOKU_VARIANTS=1 deals a random symmetry variant of each puzzle the source hands out (relabelled
+# digits, shuffled rows and columns, maybe transposed), so even a small bank never repeats a grid
+if os.environ.get('SUDOKU_VARIANTS', '') not in ('', '0'):
+    puzzle_source = VariantSource(puzzle_source)
+
+# Inline generation (when the puzzle source has nothing ready) gives up after this many seconds,
+# well inside the Lambda's 30 s timeout; /new_game then answers 503 and the client can retry
+generate_timeout = float(os.environ.get('SUDOKU_GENERATE_TIMEOUT', 5))
+
+
+class GamePage:
+    """The board page from templates/sudoku.html, rendered without Jinja.
+
+    The template's dynamic parts are the nested cell loop and a few plain
+    {{ variable }} substitutions before it; it is split once into static
+    text and a per-cell format string, so the output is byte-for-byte what
+    Jinja renders for the desktop and web apps.
+    """
+
+    FOR_ROW = "{% for i in range(9) %}"
+    FOR_COL = "{% for j in range(9) %}"
+    SET_BOX = "{% set box_id = (i // 3) * 3 + (j // 3) %}"
+    END_FOR = "{% endfor %}"
+    CELL_FIELDS = [
+        ("{{ box_id }}", "{box}"),
+        ("{% if original_cells[i][j] %}original{% endif %}", "{original}"),
+        ("{% if original_cells[i][j] %}readonly{% endif %}", "{readonly}"),
+        ("{% if board[i][j] != 0 %}{{ board[i][j] }}{% endif %}", "{value}"),
+        ("{{ i }}", "{row}"),
+        ("{{ j }}", "{col}"),
+    ]
+    # {{ name }} substitutions allowed in the text before the loop
+    VARIABLES = ("version", "token")
+
+    def __init__(self, path):
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+        if text.endswith('\n'):
+            text = text[:-1]  # Jinja drops a single trailing newline
+        row_start = text.index(self.FOR_ROW)
+        col_start = text.index(self.FOR_COL, row_start)
+        cell_start = text.index(self.SET_BOX, col_start)
+        col_end = text.index(self.END_FOR, cell_start)
+        row_end = text.index(self.END_FOR, col_end + len(self.END_FOR))
+
+        self.head = text[:row_start]
+        self.row_open = text[row_start + len(self.FOR_ROW):col_start]
+        self.cell_lead = text[col_start + len(self.FOR_COL):cell_start]
+        self.row_close = text[col_end + len(self.END_FOR):row_end]
+        self.tail = text[row_end + len(self.END_FOR):]
+
+        cell = text[cell_start + len(self.SET_BOX):col_end].replace('{', '{{').replace('}', '}}')
+        for tag, field in self.CELL_FIELDS:
+            cell = cell.replace(tag.replace('{', '{{').replace('}', '}}'), field)
+        if '{{{{' in cell or '{{%' in cell:
+            raise ValueError(f"{path}: unsupported template syntax in the cell loop")
+        self.cell = cell
+        head = self.head.replace('{', '{{').replace('}', '}}')
+        for name in self.VARIABLES:
+            head = head.replace(f'{{{{{{{{ {name} }}}}}}}}', f'{{{name}}}')
+        if '{{{{' in head or '{{%' in head:
+            raise ValueError(f"{path}: unsupported template syntax before the cell loop")
+        self.head = head
+        for static in (self.row_open, self.cell_lead, self.row_close, self.tail):
+            if '{%' in static or '{{' in static:
+                raise ValueError(f"{path}: unsupported template syntax after the cell loop")
+
+    def render(self, board, original_cells, version, token=''):
+        parts = [self.head.format(version=version, token=token)]
+        for i in range(9):
+            parts.append(self.row_open)
+            for j in range(9):
+                given = original_cells[i][j]
+                parts.append(self.cell_lead)
+                parts.append(self.cell.format(box=(i // 3) * 3 + (j // 3), row=i, col=j,
+                                              original='original' if given else '',
+                                              readonly='readonly' if given else '',
+                                              value=board[i][j] if board[i][j] != 0 else ''))
+            parts.append(self.row_close)
+        parts.append(self.tail)
+        return ''.join(parts)
+
+
+page = GamePage(template_path)
+
+
+class HTTPError(Exception):
+    """Ends a request with one of the standard HTML error pages"""
+
+    PAGES = {
+        400: ("Bad Request", "The browser (or proxy) sent a request that this server could not understand."),
+        404: ("Not Found", "The requested URL was not found on the server. If you entered the URL manually "
+                           "please check your spelling and try again."),
+        405: ("Method Not Allowed", "The method is not allowed for the requested URL."),
+        415: ("Unsupported Media Type", "Did not attempt to load JSON data because the request Content-Type "
+                                        "was not &#39;application/json&#39;."),
+        500: ("Internal Server Error", "The server encountered an internal error and was unable to complete "
+                                       "your request. Either the server is overloaded or there is an error in "
+                                       "the application."),
+    }
+
+    def __init__(self, status, headers=()):
+        super().__init__(status)
+        self.status = status
+        self.headers = list(headers)
+
+    def response(self):
+        title, description = self.PAGES[self.status]
+        body = (f"<!doctype html>\n<html lang=en>\n<title>{self.status} {title}</title>\n"
+                f"<h1>{title}</h1>\n<p>{description}</p>\n")
+        return html_response(body, self.status, self.headers)
+
+
+def html_response(body, status=200, headers=()):
+    return status, [('content-type', 'text/html; charset=utf-8')] + list(headers), body.encode('utf-8')
+
+
+def json_response(data, status=200, headers=()):
+    # Same serialization as Flask's jsonify outside debug mode
+    body = json.dumps(data, sort_keys=True, separators=(',', ':')) + '\n'
+    return status, [('content-type', 'application/json')] + list(headers), body.encode('utf-8')
+
+
+def cache_headers(etag):
+    # no-cache: browsers keep the body but revalidate it with If-None-Match on every load
+    return [('etag', f'"{etag}"'), ('cache-control', 'no-cache')]
+
+
+def not_modified(etag):
+    return 304, cache_headers(etag), b''
+
+
+class Request:
+    """The parts of an ASGI HTTP request the routes use"""
+
+    def __init__(self, scope, body):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1')
+                        for name, value in scope.get('headers', [])}
+        self.args = {}
+        for key, value in parse_qsl(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True):
+            self.args.setdefault(key, value)  # first value wins
+        self.body = body
+
+    @property
+    def json(self):
+        """Parsed JSON body; 415 unless the Content-Type is JSON, 400 if it does not parse"""
+        mimetype = self.headers.get('content-type', '').split(';')[0].strip().lower()
+        if not (mimetype == 'application/json' or
+                (mimetype.startswith('application/') and mimetype.endswith('+json'))):
+            raise HTTPError(415)
+        try:
+            return json.loads(self.body)
+        except ValueError:
+            raise HTTPError(400)
+
+    def matches(self, etag):
+        """True if If-None-Match already names etag (weak comparison, as for GET)"""
+        tags = [tag.strip() for tag in self.headers.get('if-none-match', '').split(',')]
+        return any(tag == '*' or tag.removeprefix('W/').strip('"') == etag for tag in tags if tag)
+
+
+class StoreSession:
+    """A session whose state is kept in game_state under its session id"""
+
+    token = None
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+
+    def get(self):
+        return game_state.get(self.session_id)
+
+    def set(self, state):
+        game_state.set(self.session_id, state)
+
+    def update(self, fn):
+        return game_state.update(self.session_id, fn)
+
+class TokenSession:
+    """A stateless session: the state arrives in a signed token and leaves in a new one"""
+
+    def __init__(self, token):
+        try:
+            self.state = signer.verify(token) if token else None
+        except BadToken:
+            raise HTTPError(400)
+        self.token = token or None
+
+    def get(self):
+        return self.state
+
+    def set(self, state):
+        self.state = state
+        self.token = signer.sign(state)
+
+    def update(self, fn):
+        state = fn(self.state)
+        if state is not None:
+            self.set(state)
+        return state
+
+def open_session(params):
+    """The session named by a request's query args or JSON body ('token' when stateless, else 'session')"""
+    if not isinstance(params, dict):
+        params = {}
+    if stateless:
+        return TokenSession(params.get('token'))
+    return StoreSession(params.get('session', 'default'))
+
+def with_token(result, session):
+    """Add the session's current token to a JSON result (stateless mode only)"""
+    if session.token:
+        result['token'] = session.token
+    return result
+
+def deal_default():
+    """The state of a new medium game, for a session that has none"""
     game = SudokuGame()
-    game.board = game_state[session_id]['board']
-    game.solution = game_state[session_id]['solution']
-    return game
-
-@app.route('/')
-def index():
-    session_id = request.args.get('session', 'default')
-    game = get_or_create_game(session_id)
-    return render_template('sudoku.html', 
-                         board=game.board, 
-                         original_cells=game_state[session_id]['original_cells'])
-
-@app.route('/new_game/<difficulty>')
-def new_game(difficulty):
-    session_id = request.args.get('session', 'default')
+    game.new_game('medium', source=puzzle_source, budget=SearchBudget(timeout=generate_timeout))
+    return game.dump_state(givens_from_board(game.board))
+
+def load_game(state):
+    """Decode a stored state into (game, original_cells)"""
     game = SudokuGame()
-    game.new_game(difficulty)
-    
-    game_state[session_id] = {
-        'board': game.board,
-        'solution': game.solution,
-        'original_cells': [[game.board[i][j] != 0 for j in range(9)] for i in range(9)]
-    }
-    
-    return jsonify({
-        'board': game.board,
-        'original_cells': game_state[session_id]['original_cells']
-    })
-
-@app.route('/make_move', methods=['POST'])
-def make_move():
+    original_cells = game.load_state(state)
+    return game, original_cells
+
+def get_state(session):
+    """Return the session's stored state, starting a medium game if there is none"""
+    state = session.get()
+    if state is None:
+        state = deal_default()
+        session.set(state)
+    return state
+
+def update_game(session, change):
+    """Run change(game) on the session's game in one atomic store update, saving the game if it
+    returns True. A session with no game gets a medium one dealt before the update, since inline
+    generation must not hold the store's lock (on SQLite, a database-wide write lock)"""
+    fresh = None
+    while True:
+        if fresh is None and session.get() is None:
+            fresh = deal_default()
+        expired = []
+
+        def apply(state):
+            if state is None:
+                if fresh is None:
+                    expired.append(True)  # dropped since it was read: deal outside the lock and retry
+                    return None
+                state = fresh
+            game, original_cells = load_game(state)
+            if change(game) or state is fresh:
+                return game.dump_state(original_cells)
+            return None
+
+        session.update(apply)
+        if not expired:
+            return
+
+def get_or_create_game(session):
+    """Return (game, original_cells) for the session, starting a medium game if needed"""
+    return load_game(get_state(session))
+
+def index(request):
+    session = open_session(request.args)
+    state = get_state(session)
+    etag = state_etag(state)
+    if request.matches(etag):
+        return not_modified(etag)
+    game, original_cells = load_game(state)
+    return html_response(page.render(game.board, original_cells, game.version, session.token or ''),
+                         headers=cache_headers(etag))
+
+def new_game(request, difficulty):
+    session = open_session(request.args)
+    result = {}
+    # Deal before taking the session's lock: inline generation can take seconds
+    dealt = SudokuGame()
+    try:
+        dealt.new_game(difficulty, source=puzzle_source, budget=SearchBudget(timeout=generate_timeout))
+    except SearchBudgetExceeded:
+        return json_response({'error': 'Puzzle generation took too long, please try again'}, 503)
+
+    def deal(state):
+        # Continue the session's version numbering so clients never see a version reused
+        game = SudokuGame()
+        if state is not None:
+            game.load_state(state)
+        game.load_puzzle(dealt.board, dealt.solution, dealt.puzzle_id)
+        original_cells = givens_from_board(game.board)
+        result.update(board=board_to_string(game.board), original_cells=givens_to_string(original_cells),
+                      version=game.version)
+        return game.dump_state(original_cells)
+
+    session.update(deal)
+    return json_response(with_token(result, session))
+
+def get_changes(request):
+    """Current grid, or only the cells changed since ?since=<version> when the history allows"""
+    session = open_session(request.args)
+    state = get_state(session)
+    etag = state_etag(state)
+    if request.matches(etag):
+        return not_modified(etag)
+    game, original_cells = load_game(state)
+    since = request.args.get('since', '')
+    changes = game.changed_since(int(since)) if since.isdigit() else None
+    if changes is None:
+        result = {'version': game.version, 'board': board_to_string(game.board),
+                  'original_cells': givens_to_string(original_cells)}
+    else:
+        result = {'version': game.version, 'changes': [list(change) for change in changes]}
+    return json_response(with_token(result, session), headers=cache_headers(etag))
+
+def make_move(request):
     data = request.json
     if data is None:
-        return jsonify({'error': 'No JSON data provided'}), 400
-    row, col, num = data['row'], data['col'], data['num']
-    session_id = data.get('session', 'default')
-    
-    game = get_or_create_game(session_id)
-    
-    if num == 0:
-        game.board[row][col] = 0
-        game_state[session_id]['board'] = game.board
-        return jsonify({'valid': True, 'complete': False})
-    
-    if game.is_valid_move(game.board, row, col, num):
-        game.board[row][col] = num
-        game_state[session_id]['board'] = game.board
-        is_complete = game.is_complete()
-        return jsonify({'valid': True, 'complete': is_complete})
-    else:
-        return jsonify({'valid': False, 'complete': False})
+        return json_response({'error': 'No JSON data provided'}, 400)
+    try:
+        row, col, num = data['row'], data['col'], data['num']
+        SudokuGame().check_move(row, col, num)
+    except (KeyError, TypeError, ValueError):
+        return json_response({'error': 'Invalid request data'}, 400)
+    session = open_session(data)
+
+    result = {'valid': False, 'complete': False}
+
+    def apply_move(game):
+        # Runs inside one atomic store update, so concurrent workers cannot lose a move
+        if num == 0:
+            game.clear_cell(row, col)
+            result['valid'] = True
+        elif game.is_valid_move(game.board, row, col, num):
+            game.set_cell(row, col, num)
+            result['valid'] = True
+            result['complete'] = game.is_complete()
+        result['version'] = game.version
+        return result['valid']
+
+    update_game(session, apply_move)
+    return json_response(with_token(result, session))
+
+def make_moves(request):
+    """Apply an ordered batch of moves (num 0 clears) in one store update"""
+    data = request.json
+    if data is None:
+        return json_response({'error': 'No JSON data provided'}, 400)
+    try:
+        moves = [(move['row'], move['col'], move['num']) for move in data['moves']]
+        checker = SudokuGame()
+        for move in moves:
+            checker.check_move(*move)
+    except (KeyError, TypeError, ValueError):
+        return json_response({'error': 'Invalid request data'}, 400)
+    session = open_session(data)
+
+    result = {'valid': [], 'complete': False}
+
+    def apply_moves(game):
+        result['valid'] = game.apply_moves(moves)
+        result['complete'] = game.is_complete()
+        result['version'] = game.version
+        return any(result['valid'])
+
+    update_game(session, apply_moves)
+    return json_response(with_token(result, session))
 
-@app.route('/get_hint')
-def get_hint():
-    session_id = request.args.get('session', 'default')
-    game = get_or_create_game(session_id)
+def apply_hint(request):
+    """Pick a hint and place it in one round-trip"""
+    data = request.json if request.body else None
+    session = open_session(data)
+
+    result = {'hint': None, 'complete': False}
+
+    def place_hint(game):
+        hint = game.apply_hint()
+        result['complete'] = game.is_complete()
+        result['version'] = game.version
+        if hint:
+            result['hint'] = {'row': hint[0], 'col': hint[1], 'num': hint[2]}
+        return hint is not None
+
+    update_game(session, place_hint)
+    return json_response(with_token(result, session))
+
+def get_hint(request):
+    session = open_session(request.args)
+    game, _ = get_or_create_game(session)
     hint = game.get_hint()
     if hint:
-        return jsonify({'hint': {'row': hint[0], 'col': hint[1], 'num': hint[2]}})
+        return json_response(with_token({'hint': {'row': hint[0], 'col': hint[1], 'num': hint[2]}}, session))
     else:
-        return jsonify({'hint': None})
+        return json_response(with_token({'hint': None}, session))
+
+def get_metrics(request):
+    """Solver, generator and route metrics in the Prometheus text format"""
+    return 200, [('content-type', METRICS_CONTENT_TYPE)], metrics.render().encode('utf-8')
+
+# path -> (view, methods); /new_game/<difficulty> is matched separately
+routes = {
+    '/': (index, ('GET',)),
+    '/make_move': (make_move, ('POST',)),
+    '/make_moves': (make_moves, ('POST',)),
+    '/apply_hint': (apply_hint, ('POST',)),
+    '/get_hint': (get_hint, ('GET',)),
+    '/state': (get_changes, ('GET',)),
+    '/metrics': (get_metrics, ('GET',)),
+}
+
+def route(path):
+    """Return (view, methods, path arguments) for a path, or raise a 404"""
+    if path in routes:
+        view, methods = routes[path]
+        return view, methods, ()
+    prefix = '/new_game/'
+    if path.startswith(prefix) and len(path) > len(prefix) and '/' not in path[len(prefix):]:
+        return new_game, ('GET',), (path[len(prefix):],)
+    raise HTTPError(404)
+
+def dispatch(request):
+    if not metrics.enabled:
+        return respond(request)
+    start = time.perf_counter()
+    status, headers, body = respond(request)
+    if request.path in routes:
+        rule = request.path
+    else:
+        rule = '/new_game/<difficulty>' if status != 404 else 'unmatched'
+    metrics.observe('sudoku_http_request_seconds', time.perf_counter() - start,
+                    route=rule, method=request.method, status=str(status))
+    return status, headers, body
+
+def respond(request):
+    try:
+        view, methods, path_args = route(request.path)
+        allowed = methods + ('HEAD', 'OPTIONS') if 'GET' in methods else methods + ('OPTIONS',)
+        if request.method == 'OPTIONS':
+            return html_response('', headers=[('allow', ', '.join(allowed))])
+        if request.method not in allowed:
+            raise HTTPError(405, [('allow', ', '.join(allowed))])
+        return view(request, *path_args)
+    except HTTPError as e:
+        return e.response()
+    except SearchBudgetExceeded:
+        # A game dealt inline for a session that had none ran out of time
+        return json_response({'error': 'Puzzle generation took too long, please try again'}, 503)
+    except Exception:
+        logger.exception("Exception on %s [%s]", request.path, request.method)
+        return HTTPError(500).response()
+
+async def app(scope, receive, send):
+    """ASGI application (HTTP only; Mangum runs it with lifespan off)"""
+    if scope['type'] != 'http':
+        return
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    request = Request(scope, b''.join(chunks))
+    status, headers, body = dispatch(request)
+    if status != 304:
+        headers.append(('content-length', str(len(body))))
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(name.encode('latin-1'), value.encode('latin-1')) for name, value in headers]})
+    await send({'type': 'http.response.body', 'body': b'' if request.method == 'HEAD' else body})
 
-# Convert Flask (WSGI) to ASGI and wrap with Mangum
-asgi_app = WSGIMiddleware(app)
-handler = Mangum(asgi_app, lifespan="off")
\ No newline at end of file
+handler = Mangum(app, lifespan="off")
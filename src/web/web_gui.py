@@ -1,69 +1,148 @@
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, render_template, request, jsonify, session, make_response
 import json
 from core.sudoku import SudokuGame
+from core.solvers import SearchBudget, SearchBudgetExceeded
+from core.pool import PuzzlePool
+from core.codec import board_to_string, givens_from_board, givens_to_string, state_etag
+from core.metrics import instrument_flask
 
 app = Flask(__name__)
 app.secret_key = 'sudoku_game_secret_key_123'
+# Per-route latency, plus solver and generator counters at /metrics (recorded when SUDOKU_METRICS=1)
+instrument_flask(app)
+
+# Pre-generated puzzles, refilled in the background
+puzzle_pool = PuzzlePool()
+# Seconds inline generation may take when the pool has nothing ready
+GENERATE_TIMEOUT = 5
+
+def save_game(game, original_cells):
+    # One compact packed string instead of three nested lists in the signed cookie
+    session['game'] = game.dump_state(original_cells)
 
 def get_game():
-    if 'game_board' not in session:
+    """Return (game, original_cells) for this session, starting a medium game if needed"""
+    if 'game' not in session:
         game = SudokuGame()
-        game.new_game('medium')
-        session['game_board'] = game.board
-        session['game_solution'] = game.solution
-        session['original_cells'] = [[game.board[i][j] != 0 for j in range(9)] for i in range(9)]
+        game.new_game('medium', source=puzzle_pool, budget=SearchBudget(timeout=GENERATE_TIMEOUT))
+        original_cells = givens_from_board(game.board)
+        save_game(game, original_cells)
+        return game, original_cells
     
     game = SudokuGame()
-    game.board = session['game_board']
-    game.solution = session['game_solution']
-    return game
+    original_cells = game.load_state(session['game'])
+    return game, original_cells
+
+@app.errorhandler(SearchBudgetExceeded)
+def generation_timed_out(error):
+    """Any route that had to deal a game inline and ran out of time"""
+    return jsonify({'error': 'Puzzle generation took too long, please try again'}), 503
+
+def conditional(response, etag):
+    """Tag a response so browsers revalidate it with If-None-Match on every load"""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/')
 def index():
-    game = get_game()
-    return render_template('sudoku.html', 
-                         board=game.board, 
-                         original_cells=session['original_cells'])
+    game, original_cells = get_game()
+    etag = state_etag(session['game'])
+    if request.if_none_match.contains_weak(etag):
+        return conditional(app.response_class(status=304), etag)
+    return conditional(make_response(render_template('sudoku.html', 
+                                                     board=game.board, 
+                                                     original_cells=original_cells,
+                                                     version=game.version)), etag)
 
 @app.route('/new_game/<difficulty>')
 def new_game(difficulty):
     game = SudokuGame()
-    game.new_game(difficulty)
-    session['game_board'] = game.board
-    session['game_solution'] = game.solution
-    session['original_cells'] = [[game.board[i][j] != 0 for j in range(9)] for i in range(9)]
+    if 'game' in session:
+        game.load_state(session['game'])  # continue the version numbering
+    try:
+        game.new_game(difficulty, source=puzzle_pool, budget=SearchBudget(timeout=GENERATE_TIMEOUT))
+    except SearchBudgetExceeded:
+        return jsonify({'error': 'Puzzle generation took too long, please try again'}), 503
+    original_cells = givens_from_board(game.board)
+    save_game(game, original_cells)
     
     return jsonify({
-        'board': game.board,
-        'original_cells': session['original_cells']
+        'board': board_to_string(game.board),
+        'original_cells': givens_to_string(original_cells),
+        'version': game.version
     })
 
+@app.route('/state')
+def get_changes():
+    """Current grid, or only the cells changed since ?since=<version> when the history allows"""
+    game, original_cells = get_game()
+    etag = state_etag(session['game'])
+    if request.if_none_match.contains_weak(etag):
+        return conditional(app.response_class(status=304), etag)
+    since = request.args.get('since', '')
+    changes = game.changed_since(int(since)) if since.isdigit() else None
+    if changes is None:
+        result = {'version': game.version, 'board': board_to_string(game.board),
+                  'original_cells': givens_to_string(original_cells)}
+    else:
+        result = {'version': game.version, 'changes': [list(change) for change in changes]}
+    return conditional(jsonify(result), etag)
+
 @app.route('/make_move', methods=['POST'])
 def make_move():
     data = request.json
-    if not data or 'row' not in data or 'col' not in data or 'num' not in data:
+    try:
+        row, col, num = data['row'], data['col'], data['num']
+        SudokuGame().check_move(row, col, num)
+    except (KeyError, TypeError, ValueError):
         return jsonify({'valid': False, 'complete': False, 'error': 'Invalid request data'}), 400
-
-    row, col, num = data['row'], data['col'], data['num']
     
-    game = get_game()
+    game, original_cells = get_game()
     
     if num == 0:
-        game.board[row][col] = 0
-        session['game_board'] = game.board
-        return jsonify({'valid': True, 'complete': False})
+        game.clear_cell(row, col)
+        save_game(game, original_cells)
+        return jsonify({'valid': True, 'complete': False, 'version': game.version})
     
     if game.is_valid_move(game.board, row, col, num):
-        game.board[row][col] = num
-        session['game_board'] = game.board
+        game.set_cell(row, col, num)
+        save_game(game, original_cells)
         is_complete = game.is_complete()
-        return jsonify({'valid': True, 'complete': is_complete})
+        return jsonify({'valid': True, 'complete': is_complete, 'version': game.version})
+    else:
+        return jsonify({'valid': False, 'complete': False, 'version': game.version})
+
+@app.route('/make_moves', methods=['POST'])
+def make_moves():
+    """Apply an ordered batch of moves (num 0 clears), loading and re-signing the session once"""
+    data = request.json
+    try:
+        moves = [(move['row'], move['col'], move['num']) for move in data['moves']]
+        game, original_cells = get_game()
+        valid = game.apply_moves(moves)
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'valid': [], 'complete': False, 'error': 'Invalid request data'}), 400
+    
+    if any(valid):
+        save_game(game, original_cells)
+    return jsonify({'valid': valid, 'complete': game.is_complete(), 'version': game.version})
+
+@app.route('/apply_hint', methods=['POST'])
+def apply_hint():
+    """Pick a hint and place it in one round-trip"""
+    game, original_cells = get_game()
+    hint = game.apply_hint()
+    if hint:
+        save_game(game, original_cells)
+        return jsonify({'hint': {'row': hint[0], 'col': hint[1], 'num': hint[2]}, 'complete': game.is_complete(),
+                        'version': game.version})
     else:
-        return jsonify({'valid': False, 'complete': False})
+        return jsonify({'hint': None, 'complete': game.is_complete(), 'version': game.version})
 
 @app.route('/get_hint')
 def get_hint():
-    game = get_game()
+    game, _ = get_game()
     hint = game.get_hint()
     if hint:
         return jsonify({'hint': {'row': hint[0], 'col': hint[1], 'num': hint[2]}})